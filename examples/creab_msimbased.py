@@ -5,89 +5,9 @@ Outputs multiscale Zarr and JSON with voxel_size, lookup, and regions.
 """
 
 import numpy as np
-import json
-import os
-import shutil
-import z5py
+from msim.io import save_multiscale_zarr, create_metadata_json
 import tifffile
 
-# ------------------------
-# ZARR SAVE FUNCTION
-# ------------------------
-def save_multiscale_zarr(
-    data,
-    codes,
-    out_dir,
-    voxel_size=(2.0, 2.0, 2.0),
-    n_scales=3,
-    base_chunk=(64, 128, 128),
-    logger=None
-):
-    if os.path.exists(out_dir):
-        shutil.rmtree(out_dir)
-    f = z5py.File(out_dir, use_zarr_format=True)
-    curr = data.copy()
-    datasets = []
-    for lvl in range(n_scales):
-        path = str(lvl)
-        if path in f:
-            del f[path]
-        chunks = tuple(min(c, s) for c, s in zip(base_chunk, curr.shape))
-        f.create_dataset(
-            name=path,
-            data=curr,
-            chunks=chunks,
-            compression='raw'
-        )
-        scale = 2 ** lvl
-        datasets.append({
-            "path": path,
-            "coordinateTransformations": [
-                {"type": "scale", "scale": [scale] * 3},
-                {"type": "translation", "translation": [scale / 2 - 0.5] * 3}
-            ]
-        })
-        curr = curr[::2, ::2, ::2]
-    lookup_attr = {v: {'alias': k} for k, v in codes.items()}
-    f.attrs['lookup'] = lookup_attr
-    f.attrs['voxel_size'] = voxel_size
-    multiscale_meta = {
-        "version": "0.4",
-        "axes": [
-            {"name": "z", "type": "space"},
-            {"name": "y", "type": "space"},
-            {"name": "x", "type": "space"}
-        ],
-        "datasets": datasets,
-        "type": "image",
-        "metadata": {"voxel_size": voxel_size}
-    }
-    f.attrs['multiscales'] = [multiscale_meta]
-    with open(os.path.join(out_dir, "multiscale.json"), "w") as fjson:
-        json.dump([multiscale_meta], fjson, indent=2)
-    if logger:
-        logger.info(f"Saved Neuroglancer-ready multiscale Zarr → {out_dir}")
-
-# ------------------------
-# JSON METADATA FUNCTION
-# ------------------------
-def create_metadata_json(lookup_dict, voxel_size, output_path):
-    """
-    Create JSON metadata file including voxel_size, lookup (density and mu), and regions.
-    """
-    regions = []
-    for idx, key in enumerate(sorted(lookup_dict.keys(), key=lambda x: int(x))):
-        regions.append({"ID": int(key), "GroupID": int(key)})
-
-    metadata = {
-        "voxel_size": list(voxel_size),
-        "lookup": lookup_dict,
-        "regions": regions
-    }
-
-    with open(output_path, 'w') as f:
-        json.dump(metadata, f, indent=2)
-
 # ------------------------
 # SIMPLE BRAIN PHANTOM FUNCTION
 # ------------------------
@@ -103,7 +23,7 @@ def create_brain_phantom(shape=(64, 128, 128), voxel_size=(2.0, 2.0, 2.0)):
       5: altro
     """
     nz, ny, nx = shape
-    volume = np.zeros(shape, dtype=np.int32)  # default: air
+    volume = np.zeros(shape, dtype=np.uint8)  # default: air
 
     # Central coordinates
     center_z = (nz - 1) / 2.0
@@ -161,8 +81,8 @@ def generate_phantom(phantom_type, shape=(64,128,128), voxel_size=(2.0,2.0,2.0))
 
         zarr_path = "phantom_brain.zarr"
         json_path = "phantom_brain.json"
-        save_multiscale_zarr(volume, codes, zarr_path, voxel_size)
-        create_metadata_json(lookup, voxel_size, json_path)
+        save_multiscale_zarr(volume, codes, zarr_path, voxel_size, base_chunk=(64, 128, 128))
+        create_metadata_json(lookup, voxel_size, json_path, regions=True)
 
         print(f"Generated brain phantom: {volume.shape}, voxel size: {voxel_size}")
         print(f"Files: {zarr_path}, {json_path}")
@@ -1,17 +1,28 @@
 import os
 import ctypes
 from ctypes import c_void_p, c_int, c_double
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from numpy import sin, cos
 
-# Load the native library
+# Load the native library. Without it (no CUDA build, CPU-only node) the
+# rotation falls back to the NumPy implementation below; set
+# MSIM_ROTATE_BACKEND=cpu to force the fallback even when the library exists.
 BASE_DIR = os.path.dirname(__file__)
 LIB_PATH = os.path.join(BASE_DIR, "cuda", "libmsim.so")
-_l = ctypes.CDLL(LIB_PATH)
+_l = None
+if os.environ.get("MSIM_ROTATE_BACKEND", "auto").lower() != "cpu":
+    try:
+        _l = ctypes.CDLL(LIB_PATH)
+    except OSError as e:
+        print(f"Warning: {LIB_PATH} not available, using CPU rotation: {e}")
 
-# C types
-_l.rotate_volume.argtypes   = [c_void_p, c_void_p, c_int, c_int, c_int, c_double, c_double, c_double, c_double]
-_l.rotate_volume.restype    = None
+if _l is not None:
+    # C types
+    _l.rotate_volume.argtypes   = [c_void_p, c_void_p, c_int, c_int, c_int, c_double, c_double, c_double, c_double, c_int]
+    _l.rotate_volume.restype    = None
+
+ROTATION_BACKEND = "cuda" if _l is not None else "cpu"
 
 # Wrapper functions
 def build_quaternion(alpha: float, theta: float):
@@ -26,11 +37,106 @@ axis in the YZ plane tilted by alpha from +Y.
     az = sin(alpha)
     return w, 0.0, -ay * s, -az * s
 
+def quaternion_to_matrix(quaternion):
+    """Row-major 3x3 rotation matrix of a (w, x, y, z) quaternion, as in lkernel.cu."""
+    w, x, y, z = [float(q) for q in quaternion]
+    n = np.sqrt(w*w + x*x + y*y + z*z)
+    w /= n; x /= n; y /= n; z /= n
+    return np.array([
+        [1 - 2*(y*y + z*z),     2*(x*y - z*w),     2*(x*z + y*w)],
+        [    2*(x*y + z*w), 1 - 2*(x*x + z*z),     2*(y*z - x*w)],
+        [    2*(x*z - y*w),     2*(y*z + x*w), 1 - 2*(x*x + y*y)],
+    ])
+
+def _round_half_away(a):
+    """C round(): halves are rounded away from zero (np.rint rounds to even)."""
+    return np.where(a >= 0, np.floor(a + 0.5), np.ceil(a - 0.5))
+
+def plane_base(shape, R):
+    """In-plane part of the source coordinates of every output plane (x, y, z terms)."""
+    nz, ny, nx = shape
+    x = (np.arange(nx) - 0.5 * (nx - 1))[None, :]
+    y = (np.arange(ny) - 0.5 * (ny - 1))[:, None]
+    return [R[0, i]*x + R[1, i]*y for i in range(3)]
+
+def rotated_plane(vol_in, R, iz, base=None):
+    """
+    Output plane `iz` of the rotated volume, without rotating the rest.
+
+    Args:
+        vol_in: C-contiguous (nz, ny, nx) input volume
+        R: rotation matrix from quaternion_to_matrix
+        iz: output z index
+        base: optional plane_base(vol_in.shape, R), reused across planes
+
+    Returns:
+        (ny, nx) array with the dtype of vol_in
+    """
+    nz, ny, nx = vol_in.shape
+    cx, cy, cz = 0.5 * (nx - 1), 0.5 * (ny - 1), 0.5 * (nz - 1)
+    if base is None:
+        base = plane_base(vol_in.shape, R)
+    z = iz - cz
+    rx = _round_half_away(base[0] + R[2, 0]*z + cx)
+    ry = _round_half_away(base[1] + R[2, 1]*z + cy)
+    rz = _round_half_away(base[2] + R[2, 2]*z + cz)
+    inside = ((rx >= 0) & (rx < nx) & (ry >= 0) & (ry < ny) & (rz >= 0) & (rz < nz))
+    index = (rz * ny + ry) * nx + rx
+    index = np.where(inside, index, 0).astype(np.intp)
+    return np.where(inside, vol_in.reshape(-1)[index], 0).astype(vol_in.dtype, copy=False)
+
+def _rotate_slab(vol_in, vol_out, R, z0, z1):
+    """Fill output planes z0..z1-1 by nearest-neighbour gather from vol_in."""
+    base = plane_base(vol_in.shape, R)
+    for iz in range(z0, z1):
+        vol_out[iz] = rotated_plane(vol_in, R, iz, base)
+
+def rotate_volume_cpu(vol_in: np.ndarray, vol_out: np.ndarray, quaternion: tuple, n_threads=None):
+    """
+    Rotate a 3D volume about its centre on the CPU.
+
+    Same semantics as the CUDA kernel: every output voxel samples the input at
+    R^T (p - c) + c with nearest-neighbour rounding (halves away from zero),
+    and samples outside the volume are 0. Works for any dtype, so label
+    volumes can be rotated without a float round trip.
+
+    Args:
+        vol_in: (nz, ny, nx) input volume
+        vol_out: (nz, ny, nx) output volume, written in place
+        quaternion: (w, x, y, z) rotation, e.g. from build_quaternion
+        n_threads: worker threads over z-planes (default: $MSIM_ROTATE_THREADS or all cores)
+    """
+    if vol_in.shape != vol_out.shape:
+        raise ValueError(f"Shape mismatch: {vol_in.shape} vs {vol_out.shape}")
+    R = quaternion_to_matrix(quaternion)
+    vol_in = np.ascontiguousarray(vol_in)
+    nz = vol_in.shape[0]
+
+    if n_threads is None:
+        n_threads = int(os.environ.get("MSIM_ROTATE_THREADS", os.cpu_count() or 1))
+    n_threads = max(1, min(n_threads, nz))
+    bounds = np.linspace(0, nz, n_threads + 1).astype(int)
+
+    if n_threads == 1:
+        _rotate_slab(vol_in, vol_out, R, 0, nz)
+        return
+    # NumPy releases the GIL inside the per-plane array operations
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        futures = [pool.submit(_rotate_slab, vol_in, vol_out, R, z0, z1)
+                   for z0, z1 in zip(bounds[:-1], bounds[1:]) if z1 > z0]
+        for fut in futures:
+            fut.result()
+
 def rotate_volume(vol_in: np.ndarray, vol_out: np.ndarray, quaternion: tuple):
     """
     Rotate a 3D volume using the type-dispatching CUDA kernel.
     Supports uint8, uint16, float32, float64.
+    Falls back to rotate_volume_cpu (any dtype) when libmsim.so is not available.
     """
+    if _l is None:
+        rotate_volume_cpu(vol_in, vol_out, quaternion)
+        return
+
     dtype_map = {
         np.uint8:  0,
         np.uint16: 1,
@@ -0,0 +1,159 @@
+"""
+Array backends for the wave-propagation code.
+
+`physics.projection` is written against the small namespace exposed by
+`ArrayBackend` (array module, FFTs, host transfers), so the same code runs
+on CuPy for GPUs or on NumPy + scipy.fft (optionally pyFFTW) for CPU nodes.
+
+The backend is selected with the config key ``BACKEND``:
+
+    "cupy"   - GPU arrays and cuFFT (requires CuPy)
+    "numpy"  - NumPy arrays, multi-threaded scipy.fft
+    "pyfftw" - NumPy arrays, FFTW through pyfftw.interfaces
+    "auto"   - CuPy when importable, NumPy otherwise (default)
+
+``FFT_WORKERS`` sets the number of FFT threads on the CPU backends
+(default: all cores, -1).
+"""
+
+import os
+import numpy as np
+
+
+class ArrayBackend:
+    """Array module plus FFT and transfer helpers for one device."""
+
+    name = None
+    xp = None
+
+    def asarray(self, a, dtype=None):
+        return self.xp.asarray(a, dtype=dtype)
+
+    def asnumpy(self, a):
+        return np.asarray(a)
+
+    def fft2(self, a):
+        raise NotImplementedError
+
+    def ifft2(self, a):
+        raise NotImplementedError
+
+    def rfft2(self, a, s=None):
+        raise NotImplementedError
+
+    def irfft2(self, a, s=None):
+        raise NotImplementedError
+
+    def free_memory(self):
+        """Release cached device memory (no-op on the host)."""
+        pass
+
+    def available_memory(self):
+        """Free memory of the device in bytes (free physical RAM on the host), or None if unknown."""
+        try:
+            return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+        except (AttributeError, ValueError, OSError):
+            return None
+
+
+class CupyBackend(ArrayBackend):
+    name = "cupy"
+
+    def __init__(self):
+        import cupy as cp
+        self.xp = cp
+
+    def asnumpy(self, a):
+        return self.xp.asnumpy(a)
+
+    def fft2(self, a):
+        return self.xp.fft.fft2(a)
+
+    def ifft2(self, a):
+        return self.xp.fft.ifft2(a)
+
+    def rfft2(self, a, s=None):
+        return self.xp.fft.rfft2(a, s=s)
+
+    def irfft2(self, a, s=None):
+        return self.xp.fft.irfft2(a, s=s)
+
+    def free_memory(self):
+        self.xp.get_default_memory_pool().free_all_blocks()
+
+    def available_memory(self):
+        free_bytes, _ = self.xp.cuda.runtime.memGetInfo()
+        # Blocks cached by the memory pool are free for CuPy allocations too
+        return free_bytes + self.xp.get_default_memory_pool().free_bytes()
+
+
+class NumpyBackend(ArrayBackend):
+    name = "numpy"
+
+    def __init__(self, workers=-1):
+        import scipy.fft
+        self.xp = np
+        self.workers = workers
+        self._fft = scipy.fft
+
+    def fft2(self, a):
+        return self._fft.fft2(a, workers=self.workers)
+
+    def ifft2(self, a):
+        return self._fft.ifft2(a, workers=self.workers)
+
+    def rfft2(self, a, s=None):
+        return self._fft.rfft2(a, s=s, workers=self.workers)
+
+    def irfft2(self, a, s=None):
+        return self._fft.irfft2(a, s=s, workers=self.workers)
+
+
+class PyfftwBackend(NumpyBackend):
+    name = "pyfftw"
+
+    def __init__(self, workers=-1):
+        super().__init__(workers)
+        import pyfftw
+        import pyfftw.interfaces.scipy_fft as fftw_fft
+        pyfftw.interfaces.cache.enable()
+        self._fft = fftw_fft
+        if workers is None or workers < 1:
+            self.workers = os.cpu_count() or 1
+
+
+_BACKENDS = {}
+
+
+def get_backend(config=None):
+    """
+    Return the (cached) array backend selected by config["BACKEND"].
+
+    Args:
+        config: simulation config dict (may be None)
+
+    Returns:
+        ArrayBackend instance
+    """
+    config = config or {}
+    name = str(config.get("BACKEND", "auto")).lower()
+    workers = int(config.get("FFT_WORKERS", -1))
+
+    if name == "auto":
+        try:
+            import cupy  # noqa: F401
+            name = "cupy"
+        except ImportError:
+            name = "numpy"
+
+    key = (name, workers)
+    if key not in _BACKENDS:
+        if name == "cupy":
+            _BACKENDS[key] = CupyBackend()
+        elif name == "numpy":
+            _BACKENDS[key] = NumpyBackend(workers)
+        elif name == "pyfftw":
+            _BACKENDS[key] = PyfftwBackend(workers)
+        else:
+            raise ValueError(f"Unknown BACKEND: {name}. Must be one of ['auto', 'cupy', 'numpy', 'pyfftw']")
+    return _BACKENDS[key]
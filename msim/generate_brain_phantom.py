@@ -4,10 +4,7 @@
 
 import tifffile
 import numpy as np
-import z5py
-import os
-import shutil
-import json
+from msim.io import save_multiscale_zarr, create_metadata_json
 
 # --- CONFIGURAZIONE ---
 input_tiff = 'BCI-DNI_brain.bfc.tif'
@@ -22,7 +19,7 @@ print(f"Volume shape: {volume.shape}, dtype: {volume.dtype}")
 
 # --- ETICHETTA I TESSUTI CEREBRALI ---
 # Esempio semplice, puoi personalizzare le soglie
-brain_labels = np.zeros_like(volume, dtype=np.int32)
+brain_labels = np.zeros_like(volume, dtype=np.uint8)
 brain_labels[(volume > 30) & (volume <= 80)] = 1  # gray matter
 brain_labels[(volume > 80) & (volume <= 150)] = 2  # white matter
 brain_labels[(volume > 150)] = 3  # ventricles / CSF
@@ -41,45 +38,10 @@ lookup = {
     "3": materials["ventricles"]
 }
 
-# --- SALVA ZARR MULTISCALE ---
-def save_multiscale_zarr(volume, lookup, out_dir, voxel_size, base_chunk=(64,64,64)):
-    if os.path.exists(out_dir):
-        shutil.rmtree(out_dir)
-    f = z5py.File(out_dir, use_zarr_format=True)
-    
-    curr = volume.copy()
-    datasets = []
-    for lvl in range(3):
-        path = str(lvl)
-        chunks = tuple(min(c, s) for c, s in zip(base_chunk, curr.shape))
-        f.create_dataset(name=path, data=curr, chunks=chunks, compression='raw')
-        scale = 2 ** lvl
-        datasets.append({
-            "path": path,
-            "coordinateTransformations": [
-                {"type": "scale", "scale": [scale]*3},
-                {"type": "translation", "translation": [scale/2-0.5]*3}
-            ]
-        })
-        curr = curr[::2, ::2, ::2]
-    
-    f.attrs['lookup'] = lookup
-    f.attrs['voxel_size'] = voxel_size
-    f.attrs['multiscales'] = [{
-        "version": "0.4",
-        "axes":[{"name":"z","type":"space"},{"name":"y","type":"space"},{"name":"x","type":"space"}],
-        "datasets": datasets,
-        "type": "image",
-        "metadata": {"voxel_size": voxel_size}
-    }]
-    
-    with open(os.path.join(out_dir, "multiscale.json"), 'w') as fjson:
-        json.dump(f.attrs['multiscales'], fjson, indent=2)
-
-# --- SALVA ---
-save_multiscale_zarr(brain_labels, lookup, output_zarr, voxel_size)
-with open(output_json, 'w') as fjson:
-    json.dump({"voxel_size": list(voxel_size), "lookup": lookup}, fjson, indent=2)
+# --- SALVA ZARR MULTISCALE + JSON ---
+codes = {name: i for i, name in enumerate(materials)}
+save_multiscale_zarr(brain_labels, codes, output_zarr, voxel_size, base_chunk=base_chunk)
+create_metadata_json(lookup, voxel_size, output_json)
 
 print(f"Zarr e JSON creati:\n  {output_zarr}\n  {output_json}")
 print(f"Tessuti presenti: {np.unique(brain_labels)}")
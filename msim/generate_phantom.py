@@ -4,90 +4,13 @@ Generate test phantoms in Zarr format for X-ray simulation with dose calculation
 """
 
 import numpy as np
-import json
-import os
-import shutil
-import z5py
-
-def save_multiscale_zarr(
-    data,
-    codes,
-    out_dir,
-    voxel_size=(0.25, 0.25, 0.1),
-    n_scales=3,
-    base_chunk=(64, 64, 64),
-    logger=None
-):
-    """
-    Save a 3D volume as a multiscale Zarr file with Neuroglancer-compatible metadata.
-    """
-    # Delete existing output if present
-    if os.path.exists(out_dir):
-        shutil.rmtree(out_dir)
-    # Open Zarr root
-    f = z5py.File(out_dir, use_zarr_format=True)
-    curr = data.copy()
-    datasets = []
-    for lvl in range(n_scales):
-        path = str(lvl)
-        if path in f:
-            del f[path]
-        chunks = tuple(min(c, s) for c, s in zip(base_chunk, curr.shape))
-        f.create_dataset(
-            name=path,
-            data=curr,
-            chunks=chunks,
-            compression='raw'
-        )
-        scale = 2 ** lvl
-        datasets.append({
-            "path": path,
-            "coordinateTransformations": [
-                {"type": "scale",       "scale": [scale] * 3},
-                {"type": "translation", "translation": [scale / 2 - 0.5] * 3}
-            ]
-        })
-        curr = curr[::2, ::2, ::2]
-    # Add metadata
-    lookup = {v: {'alias': k} for k, v in codes.items()}
-    f.attrs['lookup'] = lookup
-    f.attrs['voxel_size'] = voxel_size
-    multiscale_meta = {
-        "version": "0.4",
-        "axes": [
-            {"name": "z", "type": "space"},
-            {"name": "y", "type": "space"},
-            {"name": "x", "type": "space"}
-        ],
-        "datasets": datasets,
-        "type": "image",
-        "metadata": {
-            "voxel_size": voxel_size
-        }
-    }
-    f.attrs['multiscales'] = [multiscale_meta]
-    # Also write JSON file for HTTP-serving compatibility
-    with open(os.path.join(out_dir, "multiscale.json"), "w") as fjson:
-        json.dump([multiscale_meta], fjson, indent=2)
-    if logger:
-        logger.info(f"Saved Neuroglancer-ready multiscale Zarr → {out_dir}")
-
-def create_metadata_json(lookup_dict, voxel_size, output_path):
-    """
-    Create a separate JSON metadata file for simulation compatibility.
-    """
-    metadata = {
-        "voxel_size": list(voxel_size),
-        "lookup": lookup_dict
-    }
-    
-    with open(output_path, 'w') as f:
-        json.dump(metadata, f, indent=2)
+from msim.io import save_multiscale_zarr, create_metadata_json
+from msim.materials import get_material_database, material_formula
 
 def create_sphere_phantom(shape=(128, 128, 128), voxel_size=(0.5, 0.5, 0.5)):
     """Create a simple sphere phantom - properly centered."""
     nz, ny, nx = shape
-    volume = np.zeros(shape, dtype=np.int32)
+    volume = np.zeros(shape, dtype=np.uint8)
     
     # Center coordinates - use exact geometric center
     center_z = (nz - 1) / 2.0
@@ -117,7 +40,7 @@ def create_sphere_phantom(shape=(128, 128, 128), voxel_size=(0.5, 0.5, 0.5)):
 def create_cylinder_phantom(shape=(128, 128, 128), voxel_size=(0.5, 0.5, 0.5)):
     """Create a phantom with cylindrical features."""
     nz, ny, nx = shape
-    volume = np.zeros(shape, dtype=np.int32)
+    volume = np.zeros(shape, dtype=np.uint8)
     
     center_y = (ny - 1) / 2.0
     center_x = (nx - 1) / 2.0
@@ -155,7 +78,7 @@ def create_cylinder_phantom(shape=(128, 128, 128), voxel_size=(0.5, 0.5, 0.5)):
 def create_complex_bone_phantom(shape=(128, 128, 128), voxel_size=(0.5, 0.5, 0.5)):
     """Create a complex bone-like phantom with multiple materials and structures."""
     nz, ny, nx = shape
-    volume = np.zeros(shape, dtype=np.int32)
+    volume = np.zeros(shape, dtype=np.uint8)
     
     # Center coordinates - use exact geometric center
     center_z = (nz - 1) / 2.0
@@ -262,7 +185,7 @@ def create_complex_bone_phantom(shape=(128, 128, 128), voxel_size=(0.5, 0.5, 0.5
 def create_microstructure_phantom(shape=(256, 256, 256), voxel_size=(0.1, 0.1, 0.1)):
     """Create a phantom with fine microstructures for resolution testing."""
     nz, ny, nx = shape
-    volume = np.zeros(shape, dtype=np.int32)
+    volume = np.zeros(shape, dtype=np.uint8)
     
     center_z = (nz - 1) / 2.0
     center_y = (ny - 1) / 2.0
@@ -361,7 +284,7 @@ def create_microstructure_phantom(shape=(256, 256, 256), voxel_size=(0.1, 0.1, 0
 def create_dose_test_phantom(shape=(64, 64, 64), voxel_size=(1.0, 1.0, 1.0)):
     """Create a phantom specifically for dose testing with known materials."""
     nz, ny, nx = shape
-    volume = np.zeros(shape, dtype=np.int32)
+    volume = np.zeros(shape, dtype=np.uint8)
     
     center_z = (nz - 1) / 2.0
     center_y = (ny - 1) / 2.0
@@ -396,8 +319,14 @@ def create_dose_test_phantom(shape=(64, 64, 64), voxel_size=(1.0, 1.0, 1.0)):
     
     return volume
 
-def generate_phantom(phantom_type="sphere", shape=(128, 128, 128), voxel_size=(0.5, 0.5, 0.5)):
-    """Generate phantom and save files."""
+def generate_phantom(phantom_type="sphere", shape=(128, 128, 128), voxel_size=(0.5, 0.5, 0.5), energy_kev=None):
+    """
+    Generate phantom and save files.
+
+    If energy_kev is given, the X-ray constants of the phantom materials are
+    looked up through the shared material cache (so later scans at that
+    energy skip xraylib) and printed with the material summary.
+    """
     
     # Extended material definitions with accurate properties for dose calculation
     materials = {
@@ -498,10 +427,15 @@ def generate_phantom(phantom_type="sphere", shape=(128, 128, 128), voxel_size=(0
     
     # Print material properties for dose calculation
     print(f"\nMaterial properties for dose calculation:")
+    database = get_material_database() if energy_kev is not None else None
     for label, props in lookup.items():
         if props.get("composition"):
-            formula = ''.join(f"{el}{amt}" for el, amt in props["composition"].items())
+            formula = material_formula(props["composition"])
             print(f"  Label {label}: {formula}, ρ={props['density']:.3f} g/cm³")
+            if database is not None and props["density"] > 0:
+                constants = database.get(props["composition"], props["density"], energy_kev)
+                mu = constants["cs_total"] * props["density"]
+                print(f"    @ {energy_kev} keV: δ={constants['delta']:.3e}, μ={mu:.3f} cm⁻¹")
         else:
             print(f"  Label {label}: vacuum/air, ρ={props['density']:.6f} g/cm³")
     
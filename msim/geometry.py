@@ -1,120 +1,576 @@
+import os
+import time
+import multiprocessing
 import numpy as np
-import cupy as cp
-from msim.physics import projection
-from msim.LSim_wrap import rotate_volume, build_quaternion
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from msim.backend import get_backend
+from msim.physics import (
+    projection, projection_batch, use_projection_approximation,
+    optical_depth_map, dose_factor_map, incident_fluence
+)
+from msim.propagator import get_propagator_plan
+from msim.labels import label_dtype
+from msim.LSim_wrap import rotate_volume, build_quaternion, quaternion_to_matrix, plane_base, rotated_plane
+
+def rotation_dtype(volume_labels):
+    """
+    Smallest dtype rotate_volume supports that holds every label exactly.
+    
+    The compact unsigned dtype of labels.label_dtype when it is uint8 or
+    uint16, float32 (exact up to 2**24) otherwise.
+    """
+    if volume_labels.dtype in (np.uint8, np.uint16):
+        return volume_labels.dtype
+    if volume_labels.size == 0:
+        return np.dtype(np.uint8)
+    lo, hi = int(volume_labels.min()), int(volume_labels.max())
+    if lo >= 0 and label_dtype(hi).itemsize <= 2:
+        return label_dtype(hi)
+    if max(abs(lo), abs(hi)) > 2**24:
+        raise ValueError(f"Labels in [{lo}, {hi}] cannot be rotated exactly as float32")
+    return np.dtype(np.float32)
+
+def peak_rss_bytes():
+    """Peak resident memory of this process (bytes), or None if unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # kB on Linux
+
+# Upper bound of the automatic projection batch size (GPU / host backends; on the
+# host larger batches only add cache pressure, FFTs are threaded per transform)
+MAX_AUTO_BATCH = 16
+MAX_AUTO_BATCH_HOST = 4
+
+def projection_batch_size(volume_shape, label_itemsize, config, raymarch=False, n_angles=None):
+    """
+    Number of angles propagated together (config["PROJECTION_BATCH"]).
+    
+    An integer is used as given. "auto" (default) fits as many angles as half
+    of the free device memory (host RAM for the NumPy backends) holds, up to
+    MAX_AUTO_BATCH (MAX_AUTO_BATCH_HOST on the host). Each angle needs its rotated label buffer (none when ray
+    marching), the padded complex wavefield with its FFT temporaries and the
+    zero-padded scatter convolution buffer.
+    
+    Args:
+        volume_shape: (nz, ny, nx)
+        label_itemsize: bytes per label of the rotated buffers
+        config: simulation config (PROJECTION_BATCH, PAD, BACKEND)
+        raymarch: True if no rotated buffers are stored
+        n_angles: optional number of angles (the batch is not larger)
+    
+    Returns:
+        int >= 1
+    """
+    setting = config.get("PROJECTION_BATCH", "auto")
+    if setting != "auto":
+        batch = max(1, int(setting))
+    else:
+        nz, ny, nx = volume_shape
+        pad = config["PAD"]
+        field_px = (ny + 2*pad) * (nx + 2*pad)
+        # ~6 complex128 wavefield temporaries + scatter buffer and spectrum (4x the area)
+        per_angle = field_px * (6*16 + 4*8 + 2*16)
+        if not raymarch:
+            per_angle += nz * ny * nx * label_itemsize
+        backend = get_backend(config)
+        free_bytes = backend.available_memory()
+        batch = 1 if free_bytes is None else int(0.5 * free_bytes // per_angle)
+        batch = min(max(batch, 1), MAX_AUTO_BATCH if backend.name == "cupy" else MAX_AUTO_BATCH_HOST)
+    return batch if n_angles is None else max(1, min(batch, n_angles))
 
 class GPUVolumeManager:
-    """Manages GPU memory for volume rotations efficiently."""
+    """
+    Rotates one label volume for many angles without per-angle allocations.
     
-    def __init__(self, volume_labels, lookup, voxel_size, config):
+    The labels are kept once in the smallest dtype rotate_volume supports
+    (uint8 / uint16, float32 beyond 65535 labels), and every angle rotates
+    into the same preallocated output buffer, which projection() and the dose
+    accumulator read directly. rotate_and_project_batch() rotates several
+    angles into one buffer each and propagates them together.
+    """
+    
+    def __init__(self, volume_labels, lookup, voxel_size, config, plan=None):
         self.volume_shape = volume_labels.shape
+        self.plan = plan
         self.lookup = lookup
         self.voxel_size = voxel_size
         self.config = config
+        self.backend = get_backend(config)
+        self.raymarch = config.get("PROJECTOR", "rotate") == "raymarch"
         
-        # Keep original volume on GPU
-        self.volume_gpu = cp.asarray(volume_labels, dtype=cp.float32)
-        self.rotated_gpu = cp.empty_like(self.volume_gpu)
+        # Input buffer: labels in compact dtype (no copy if already compact and contiguous)
+        self.label_dtype = rotation_dtype(volume_labels)
+        self.volume_host = np.ascontiguousarray(volume_labels, dtype=self.label_dtype)
+        # Output buffers, reused for every angle / batch slot (not needed when ray marching)
+        self.rotated_hosts = [] if self.raymarch else [np.empty_like(self.volume_host)]
         
-        print(f"GPU Volume Manager initialized: {self.volume_shape}")
-        print(f"GPU memory used: {self.volume_gpu.nbytes / 1e9:.2f} GB")
+        mode = "raymarch" if self.raymarch else self.backend.name
+        print(f"Volume Manager initialized ({mode}): {self.volume_shape}, labels as {self.label_dtype}")
+        print(f"Label buffers: {self.buffer_bytes() / 1e9:.2f} GB")
+    
+    def buffer_bytes(self):
+        """Bytes held in the label buffers."""
+        buffers = [self.volume_host] + self.rotated_hosts
+        return sum(b.nbytes for b in buffers if b is not None)
     
-    def rotate_and_project(self, rotation_deg, tilt_deg=0):
-        """Rotate volume on GPU and simulate projection."""
+    def _rotate(self, slot, rotation_deg, tilt_deg, dose_accumulator):
+        """Rotate into buffer `slot` (or a view when ray marching), optionally adding the dose."""
         # Build quaternion
         tilt_rad = np.deg2rad(tilt_deg)
         theta_rad = np.deg2rad(rotation_deg)
         quat = build_quaternion(tilt_rad, theta_rad)
         
-        # Rotate volume (stays on GPU)
-        # Note: You'll need to modify LSim_wrap to accept GPU arrays directly
-        # For now, we do one CPU transfer per rotation
-        volume_cpu = cp.asnumpy(self.volume_gpu)
-        rotated_cpu = np.empty_like(volume_cpu)
-        volume_contiguous = np.ascontiguousarray(volume_cpu, dtype=np.float32)
-        rotated_contiguous = np.ascontiguousarray(rotated_cpu, dtype=np.float32)
+        if self.raymarch:
+            rotated = RotatedVolumeView(self.volume_host, quat)
+        else:
+            while len(self.rotated_hosts) <= slot:
+                self.rotated_hosts.append(np.empty_like(self.volume_host))
+            rotate_volume(self.volume_host, self.rotated_hosts[slot], quat)
+            rotated = self.rotated_hosts[slot]
+        
+        if dose_accumulator is not None:
+            dose_accumulator.add(rotated, quat)
+        return rotated
+    
+    def rotate_and_project(self, rotation_deg, tilt_deg=0, dose_accumulator=None, rng=None):
+        """Rotate volume and simulate projection, optionally adding its dose."""
+        rotated = self._rotate(0, rotation_deg, tilt_deg, dose_accumulator)
+        
+        # Project (wave propagation runs on the configured backend)
+        return projection(rotated, self.lookup, self.voxel_size, self.config, plan=self.plan, rng=rng)
+    
+    def rotate_and_project_batch(self, angles_deg, tilt_deg=0, dose_accumulators=None, rngs=None, stats=None,
+                                 path_lengths=None, indices=None):
+        """
+        Rotate several angles and propagate them as one batch.
         
-        rotate_volume(volume_contiguous, rotated_contiguous, quat)
-        rotated_int = rotated_contiguous.astype(np.int32)
+        Args:
+            angles_deg: B rotation angles (degrees)
+            tilt_deg: tilt angle (degrees)
+            dose_accumulators: optional B DoseAccumulators (or None entries)
+            rngs: optional B RandomStates
+            stats: optional dict of FFT counts (see physics.projection_batch)
+            path_lengths: optional pathlength.PathLengthCache; the path
+                lengths of each rotated volume are stored under `indices`
+            indices: B series indices of the angles (for path_lengths)
         
-        # Project (this happens on GPU in physics.projection)
-        return projection(rotated_int, self.lookup, self.voxel_size, self.config)
+        Returns:
+            (B, ny, nx) projections
+        """
+        dose_accumulators = dose_accumulators or [None] * len(angles_deg)
+        rotated = [self._rotate(slot, angle, tilt_deg, acc)
+                   for slot, (angle, acc) in enumerate(zip(angles_deg, dose_accumulators))]
+        if path_lengths is not None:
+            for i, volume in zip(indices, rotated):
+                path_lengths.add(i, volume)
+        return projection_batch(rotated, self.lookup, self.voxel_size, self.config, plan=self.plan,
+                                rngs=rngs, stats=stats)
+    
+    def memory_report(self):
+        """
+        Print and return the memory high-water mark of the series.
+        
+        `legacy_bytes` is what the previous float32 round trip held per angle
+        (device float32 volume and rotated copy, host float32 in/out, int32 result).
+        """
+        n_voxels = int(np.prod(self.volume_shape))
+        report = {
+            'label_dtype': str(self.label_dtype),
+            'buffer_bytes': self.buffer_bytes(),
+            'legacy_bytes': n_voxels * (4 + 4 + 4 + 4 + 4),
+            'peak_rss_bytes': peak_rss_bytes(),
+        }
+        if self.backend.name == "cupy":
+            report['device_pool_bytes'] = self.backend.xp.get_default_memory_pool().total_bytes()
+        
+        print(f"Label buffers: {report['buffer_bytes'] / 1e9:.3f} GB "
+              f"(float32 round trip: {report['legacy_bytes'] / 1e9:.3f} GB)")
+        if report['peak_rss_bytes'] is not None:
+            print(f"Peak host memory: {report['peak_rss_bytes'] / 1e9:.3f} GB")
+        if 'device_pool_bytes' in report:
+            print(f"Device memory pool: {report['device_pool_bytes'] / 1e9:.3f} GB")
+        return report
     
     def cleanup(self):
-        """Free GPU memory."""
-        del self.volume_gpu
-        del self.rotated_gpu
-        cp.get_default_memory_pool().free_all_blocks()
+        """Release the label buffers and cached device memory."""
+        self.volume_host = None
+        self.rotated_hosts = []
+        self.backend.free_memory()
 
-def simulate_tomography_projection(volume_labels, lookup, voxel_size, rotation_deg, config):
-    """Simulate tomography projection - memory efficient."""
-    # For single projections, use simple approach
-    quat = build_quaternion(0.0, np.deg2rad(rotation_deg))
+class DoseAccumulator:
+    """
+    Accumulates absorbed dose over a projection series in the sample frame.
+    
+    For every exposed angle the optical depth in front of each voxel is
+    computed along the beam (z) in the rotated frame, from the rotated volume
+    the projection already uses, and rotated back into the sample frame. The
+    dose is then the fluence times μ_en / ρ of the unrotated labels, so every
+    material voxel receives dose and vacuum none (rotating a dose map itself
+    would leave holes and leak dose into vacuum at material boundaries).
+    Voxels that rotate out of the volume see the unattenuated beam.
+    With DOSE_ANGLE_STRIDE = k only every k-th angle is evaluated and the sum
+    is rescaled to the full series.
+    
+    Args:
+        volume_labels: (nz, ny, nx) labels in the sample frame (array or io.LazyVolume)
+        lookup, voxel_size, config: as for the projection series
+    """
+    
+    def __init__(self, volume_labels, lookup, voxel_size, config):
+        self.lookup = lookup
+        self.voxel_size = voxel_size
+        self.config = config
+        self.incident_photons = config.get("INCIDENT_PHOTONS", 1e6)
+        self.energy_kev = config.get("ENERGY_KEV", 23.0)
+        self.stride = max(1, int(config.get("DOSE_ANGLE_STRIDE", 1)))
+        # Dose per unit fluence of every sample-frame voxel (0 in vacuum)
+        self.dose_factor = dose_factor_map(volume_labels, lookup, self.energy_kev, voxel_size, config=config)
+        self.dose_sum = np.zeros(volume_labels.shape, dtype=np.float32)
+        self.n_added = 0
     
-    rotated = np.empty_like(volume_labels, dtype=volume_labels.dtype)
-    volume_contiguous = np.ascontiguousarray(volume_labels, dtype=np.float32)
-    rotated_contiguous = np.ascontiguousarray(rotated, dtype=np.float32)
+    def wants(self, index):
+        """Whether the angle at position `index` of the series is evaluated."""
+        return index % self.stride == 0
     
-    rotate_volume(volume_contiguous, rotated_contiguous, quat)
-    rotated_int = rotated_contiguous.astype(np.int32)
+    def add(self, rotated_labels, quat):
+        """Add the dose of one exposure of the volume rotated by `quat`."""
+        depth_rotated = optical_depth_map(
+            rotated_labels, self.lookup, self.energy_kev, self.voxel_size, config=self.config
+        )
+        # Inverse rotation (conjugate quaternion) maps the optical depth back to the sample frame
+        w, x, y, z = quat
+        depth_sample = np.zeros_like(depth_rotated)
+        rotate_volume(depth_rotated, depth_sample, (w, -x, -y, -z))
+        fluence = incident_fluence(self.incident_photons, self.energy_kev) * np.exp(-depth_sample)
+        self.dose_sum += fluence * self.dose_factor
+        self.n_added += 1
     
-    return projection(rotated_int, lookup, voxel_size, config)
+    def dose_map(self, n_angles):
+        """Total dose (Gy) for a series of `n_angles` exposures."""
+        if self.n_added == 0:
+            return self.dose_sum.copy()
+        return self.dose_sum * np.float32(n_angles / self.n_added)
 
-def simulate_laminography_projection(volume_labels, lookup, voxel_size, rotation_deg, tilt_deg, config):
-    """Simulate laminography projection - memory efficient."""
-    # For single projections, use simple approach
+class RotatedVolumeView:
+    """
+    Rotated label volume that is never materialized.
+    
+    Indexing with a z index (or a z slice) samples the requested plane(s) of
+    the rotated volume directly from the original, along the rotated ray
+    paths, with the same nearest-neighbour rule as rotate_volume. Memory use
+    is one (ny, nx) plane instead of a full rotated copy per angle, and
+    projection() / calculate_dose_map() accept the view in place of an array.
+    """
+    
+    def __init__(self, volume_labels, quat):
+        self.volume = np.ascontiguousarray(volume_labels)
+        self.quat = quat
+        self.shape = self.volume.shape
+        self.dtype = self.volume.dtype
+        self.ndim = 3
+        self._R = quaternion_to_matrix(quat)
+        self._base = plane_base(self.shape, self._R)
+    
+    def __len__(self):
+        return self.shape[0]
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            planes = range(*index.indices(self.shape[0]))
+            out = np.empty((len(planes),) + self.shape[1:], dtype=self.dtype)
+            for k, iz in enumerate(planes):
+                out[k] = rotated_plane(self.volume, self._R, iz, self._base)
+            return out
+        iz = int(index)
+        if iz < 0:
+            iz += self.shape[0]
+        return rotated_plane(self.volume, self._R, iz, self._base)
+    
+    def materialize(self):
+        """Full rotated volume as an array."""
+        return self[:]
+
+def rotate_labels(volume_labels, rotation_deg, tilt_deg=0, config=None):
+    """
+    Rotate a label volume; returns (rotated labels, quaternion).
+    
+    The rotation runs in the compact label dtype (see rotation_dtype)
+    and the rotated labels keep that dtype.
+    
+    With config["PROJECTOR"] = "raymarch" a RotatedVolumeView is returned
+    instead of the rotated array.
+    """
     quat = build_quaternion(np.deg2rad(tilt_deg), np.deg2rad(rotation_deg))
     
-    rotated = np.empty_like(volume_labels, dtype=volume_labels.dtype)
-    volume_contiguous = np.ascontiguousarray(volume_labels, dtype=np.float32)
-    rotated_contiguous = np.ascontiguousarray(rotated, dtype=np.float32)
+    if config is not None and config.get("PROJECTOR", "rotate") == "raymarch":
+        return RotatedVolumeView(volume_labels, quat), quat
+    
+    volume_contiguous = np.ascontiguousarray(volume_labels, dtype=rotation_dtype(volume_labels))
+    rotated = np.empty_like(volume_contiguous)
+    
+    rotate_volume(volume_contiguous, rotated, quat)
+    return rotated, quat
+
+def simulate_tomography_projection(volume_labels, lookup, voxel_size, rotation_deg, config, plan=None, dose_accumulator=None, rng=None,
+                                   path_lengths=None, index=None):
+    """Simulate tomography projection - memory efficient (path lengths stored under `index` if a cache is given)."""
+    return simulate_laminography_projection(volume_labels, lookup, voxel_size, rotation_deg, 0.0, config, plan=plan,
+                                            dose_accumulator=dose_accumulator, rng=rng,
+                                            path_lengths=path_lengths, index=index)
+
+def simulate_laminography_projection(volume_labels, lookup, voxel_size, rotation_deg, tilt_deg, config, plan=None, dose_accumulator=None, rng=None,
+                                     path_lengths=None, index=None):
+    """Simulate laminography projection - memory efficient (path lengths stored under `index` if a cache is given)."""
+    # For single projections, use simple approach
+    rotated_int, quat = rotate_labels(volume_labels, rotation_deg, tilt_deg, config)
+    
+    if dose_accumulator is not None:
+        dose_accumulator.add(rotated_int, quat)
+    if path_lengths is not None:
+        path_lengths.add(index, rotated_int)
     
-    rotate_volume(volume_contiguous, rotated_contiguous, quat)
-    rotated_int = rotated_contiguous.astype(np.int32)
+    return projection(rotated_int, lookup, voxel_size, config, plan=plan, rng=rng)
+
+def angle_rng(base_seed, index):
+    """
+    Random state for the angle at position `index` of a series.
     
-    return projection(rotated_int, lookup, voxel_size, config)
+    Derived from (base_seed, index) only, so noise does not depend on the
+    order or the process in which angles are simulated. It is a host NumPy
+    RandomState on every backend (projection() moves its draws to the
+    device), so serial, batched and pool series draw the same numbers.
+    Returns None (global random state) when base_seed is None.
+    """
+    if base_seed is None:
+        return None
+    seed = int(np.random.SeedSequence([int(base_seed), int(index)]).generate_state(1)[0])
+    return np.random.RandomState(seed)
+
+# Per-process state of the projection worker pool
+_worker = {}
+
+def _init_worker(shm_name, shape, dtype, lookup, voxel_size, config):
+    """Attach a worker process to the shared, read-only label volume."""
+    os.environ["MSIM_ROTATE_THREADS"] = "1"  # one core per worker
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker['shm'] = shm
+    _worker['volume'] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _worker['lookup'] = lookup
+    _worker['voxel_size'] = voxel_size
+    _worker['config'] = config
 
-def simulate_projection_series(volume_labels, lookup, voxel_size, angles_deg, tilt_deg, config):
+def _project_in_worker(task):
+    """Rotate and project one angle inside a worker process; returns (projection, path lengths or None)."""
+    index, angle, tilt_deg, base_seed, want_paths = task
+    volume = _worker['volume']
+    config = _worker['config']
+    pad = config["PAD"]
+    plan = get_propagator_plan((volume.shape[1] + 2*pad, volume.shape[2] + 2*pad), _worker['voxel_size'], config)
+    rotated_int, _ = rotate_labels(volume, angle, tilt_deg, config)
+    paths = None
+    if want_paths:
+        from msim.pathlength import label_path_lengths  # pathlength imports this module
+        paths = label_path_lengths(rotated_int)
+    proj = projection(rotated_int, _worker['lookup'], _worker['voxel_size'], config,
+                      plan=plan, rng=angle_rng(base_seed, index))
+    return proj, paths
+
+def simulate_projection_series(volume_labels, lookup, voxel_size, angles_deg, tilt_deg, config, dose_accumulator=None, sink=None, completed=None, path_lengths=None):
     """
     Simulate series of projections - optimized for large volumes and many angles.
+    
+    If a DoseAccumulator is given, the dose of each selected angle is added
+    to it from the same rotated volume used for the projection.
+    
+    volume_labels may be an io.LazyVolume; it is read into one host array
+    (in the dtype of rotate_labels) at the start of the series.
+    
+    If `sink` is given (e.g. a pre-allocated h5py dataset of shape
+    (n_angles, ny, nx)), each projection is written to sink[i] and flushed as
+    soon as it is produced, nothing is kept in memory and the sink is returned.
+    Otherwise the projections are returned as one (n_angles, ny, nx) array.
+    
+    `completed` (checkpointing, used with a sink) is a writable boolean
+    array-like of length n_angles, e.g. an h5py dataset next to the sink.
+    Angles already marked True are skipped (their dose, if requested, is still
+    accumulated) and each new projection is marked True once it is written.
+    
+    With config["N_WORKERS"] > 1, angles are distributed over a process pool
+    that shares the label volume read-only through shared memory; projections
+    are stored in angle order. Noise is seeded per angle from RANDOM_SEED
+    (or a fresh seed per series), so results do not depend on the worker count.
+    Workers are spawned processes on the NumPy backend with one FFT and one
+    rotation thread each, so N_WORKERS is the number of cores used.
+    
+    Otherwise, for more than 5 angles, consecutive angles are propagated in
+    batches (see projection_batch_size and config["PROJECTION_BATCH"]); the
+    results do not depend on the batch size. The throughput of the series is
+    printed in projections per second, with the number of slice FFT pairs
+    saved on uniform slices, slabs and by the projection approximation (see
+    physics.projection_batch).
+    
+    If a pathlength.PathLengthCache is given as `path_lengths`, the path
+    length of every label along every ray is stored for each angle (from the
+    same rotated volume), so the series can be re-rendered for other
+    materials or energies with pathlength.render_projection_series.
     """
     print(f"Starting projection series: {len(angles_deg)} angles, tilt={tilt_deg}°")
     print(f"Volume size: {volume_labels.shape}, Memory: {volume_labels.nbytes / 1e9:.2f} GB")
     
+    # Every angle rotates the whole volume: read a lazily opened one
+    # (io.LazyVolume) once, in the dtype of the rotation, not once per angle
+    volume_labels = np.ascontiguousarray(volume_labels, dtype=rotation_dtype(volume_labels))
+    
+    # Propagation kernels and scatter PSF depend only on the geometry: build once per series
+    pad = config["PAD"]
+    padded_shape = (volume_labels.shape[1] + 2*pad, volume_labels.shape[2] + 2*pad)
+    plan = get_propagator_plan(padded_shape, voxel_size, config)
+    nz = volume_labels.shape[0]
+    mode = "projection approximation" if use_projection_approximation(plan, nz, config) else "multislice"
+    print(f"Propagation: {mode} (λ·T/dx² = {plan.fresnel_error(nz):.2e})")
+    
+    projections = []
+    n_computed = [0]
+    fft_stats = {}
+    t_start = time.perf_counter()
+    done = np.zeros(len(angles_deg), dtype=bool) if completed is None else np.array(completed[...], dtype=bool)
+    if done.any():
+        print(f"Resuming: {int(done.sum())}/{len(angles_deg)} projections already completed")
+    
+    def store(i, proj):
+        n_computed[0] += 1
+        if sink is None:
+            projections.append(proj)
+        else:
+            sink[i] = proj
+            if hasattr(sink, "flush"):
+                sink.flush()
+        if completed is not None:
+            completed[i] = True
+            if hasattr(completed, "flush"):
+                completed.flush()
+    
+    def skip(i, angle, dose_acc):
+        """Rotate an angle not projected here (completed, or in a worker) for its dose and path lengths."""
+        wants_paths = path_lengths is not None and i not in path_lengths
+        if dose_acc is not None or wants_paths:
+            rotated_int, quat = rotate_labels(volume_labels, angle, tilt_deg, config)
+            if dose_acc is not None:
+                dose_acc.add(rotated_int, quat)
+            if wants_paths:
+                path_lengths.add(i, rotated_int)
+    
+    n_workers = int(config.get("N_WORKERS", 1))
+    base_seed = config.get("RANDOM_SEED")
+    if base_seed is None and n_workers > 1:
+        # Workers must not share the global random state of the parent
+        base_seed = np.random.SeedSequence().entropy % 2**63
+    
+    if n_workers > 1:  # Process pool over angles, volume in shared memory
+        todo = [i for i in range(len(angles_deg)) if not done[i]]
+        # Workers are CPU-only, single-threaded, and started fresh (spawn): a
+        # forked child would inherit the CUDA context, device plans and the
+        # open material database of this process
+        worker_config = dict(config, BACKEND="numpy", FFT_WORKERS=1)
+        shm = shared_memory.SharedMemory(create=True, size=max(volume_labels.nbytes, 1))
+        shared = np.ndarray(volume_labels.shape, dtype=volume_labels.dtype, buffer=shm.buf)
+        try:
+            shared[...] = volume_labels
+            print(f"Process pool: {n_workers} workers, {len(todo)} angles")
+            with ProcessPoolExecutor(
+                max_workers=n_workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker,
+                initargs=(shm.name, volume_labels.shape, volume_labels.dtype, lookup, voxel_size, worker_config)
+            ) as pool:
+                tasks = [(i, angles_deg[i], tilt_deg, base_seed, path_lengths is not None) for i in todo]
+                results = pool.map(_project_in_worker, tasks)
+                
+                # Dose (rotation only) runs here while the workers project
+                def dose_acc_for(i):
+                    return dose_accumulator if dose_accumulator is not None and dose_accumulator.wants(i) else None
+                for i, angle in enumerate(angles_deg):
+                    if done[i]:
+                        skip(i, angle, dose_acc_for(i))
+                for i, (proj, paths) in zip(todo, results):
+                    if paths is not None:
+                        path_lengths.store(i, *paths)
+                    skip(i, angles_deg[i], dose_acc_for(i))
+                    store(i, proj)
+                    print(f"Angle {angles_deg[i]:.1f}° done ({i+1}/{len(angles_deg)})")
+        finally:
+            del shared
+            shm.close()
+            shm.unlink()
+    
     # For many projections, use GPU manager to avoid repeated transfers
-    if len(angles_deg) > 5:  # Use GPU manager for multiple projections
-        gpu_manager = GPUVolumeManager(volume_labels, lookup, voxel_size, config)
+    elif len(angles_deg) > 5:  # Use GPU manager for multiple projections
+        gpu_manager = GPUVolumeManager(volume_labels, lookup, voxel_size, config, plan=plan)
+        batch = projection_batch_size(volume_labels.shape, gpu_manager.label_dtype.itemsize, config,
+                                      raymarch=gpu_manager.raymarch, n_angles=len(angles_deg))
+        print(f"Projection batch: {batch} angles")
         
-        projections = []
         try:
-            for i, angle in enumerate(angles_deg):
-                print(f"Processing angle {i+1}/{len(angles_deg)}: {angle:.1f}°")
+            for start in range(0, len(angles_deg), batch):
+                indices, dose_accs = [], []
+                for i in range(start, min(start + batch, len(angles_deg))):
+                    angle = angles_deg[i]
+                    print(f"Processing angle {i+1}/{len(angles_deg)}: {angle:.1f}°")
+                    dose_acc = dose_accumulator if dose_accumulator is not None and dose_accumulator.wants(i) else None
+                    if done[i]:
+                        skip(i, angle, dose_acc)
+                        continue
+                    indices.append(i)
+                    dose_accs.append(dose_acc)
+                if not indices:
+                    continue
                 
-                proj = gpu_manager.rotate_and_project(angle, tilt_deg)
-                projections.append(proj)
+                projs = gpu_manager.rotate_and_project_batch(
+                    [angles_deg[i] for i in indices], tilt_deg, dose_accumulators=dose_accs,
+                    rngs=[angle_rng(base_seed, i) for i in indices], stats=fft_stats,
+                    path_lengths=path_lengths, indices=indices)
+                for i, proj in zip(indices, projs):
+                    store(i, proj)
                 
-                # Free GPU memory periodically
-                if i % 10 == 0:
-                    cp.get_default_memory_pool().free_all_blocks()
+                # Free device memory periodically
+                if any(i % 10 == 0 for i in indices):
+                    gpu_manager.backend.free_memory()
         
         finally:
+            gpu_manager.memory_report()
             gpu_manager.cleanup()
     
     else:  # For few projections, use simple approach
-        projections = []
-        for angle in angles_deg:
+        for i, angle in enumerate(angles_deg):
+            dose_acc = dose_accumulator if dose_accumulator is not None and dose_accumulator.wants(i) else None
+            if done[i]:
+                skip(i, angle, dose_acc)
+                continue
             if tilt_deg == 0:
-                proj = simulate_tomography_projection(volume_labels, lookup, voxel_size, angle, config)
+                proj = simulate_tomography_projection(volume_labels, lookup, voxel_size, angle, config, plan=plan,
+                                                      dose_accumulator=dose_acc, rng=angle_rng(base_seed, i),
+                                                      path_lengths=path_lengths, index=i)
             else:
-                proj = simulate_laminography_projection(volume_labels, lookup, voxel_size, angle, tilt_deg, config)
+                proj = simulate_laminography_projection(volume_labels, lookup, voxel_size, angle, tilt_deg, config, plan=plan,
+                                                        dose_accumulator=dose_acc, rng=angle_rng(base_seed, i),
+                                                        path_lengths=path_lengths, index=i)
             
-            projections.append(proj)
+            store(i, proj)
             print(f"Angle {angle:.1f}° done")
     
-    return np.array(projections)
+    elapsed = time.perf_counter() - t_start
+    if n_computed[0] and elapsed > 0:
+        print(f"Throughput: {n_computed[0] / elapsed:.2f} projections/s ({n_computed[0]} projections in {elapsed:.1f} s)")
+    if fft_stats.get('skipped_fft_pairs'):
+        total = fft_stats['fft_pairs'] + fft_stats['skipped_fft_pairs']
+        print(f"Skipped {fft_stats['skipped_fft_pairs']} of {total} slice FFT pairs (uniform slices, slabs, projection approximation)")
+    
+    return np.array(projections) if sink is None else sink
 
 def check_gpu_memory():
     """Check available GPU memory before starting."""
+    import cupy as cp
     mempool = cp.get_default_memory_pool()
     total_bytes = mempool.total_bytes()
     used_bytes = mempool.used_bytes()
@@ -0,0 +1,18 @@
+"""
+Volume I/O: multiscale label volumes in Zarr, N5 or HDF5.
+
+    reader   - open_label_dataset, LazyVolume (chunk-aligned slab reads),
+               read_metadata_json
+    writer   - save_multiscale_zarr (streaming pyramid, compressed parallel
+               writes), create_metadata_json
+    metadata - format detection, OME-NGFF multiscales, file attributes
+
+All phantom generators and the simulator go through this package, so format,
+chunking and metadata changes apply everywhere.
+"""
+
+from msim.io.metadata import (
+    volume_format, multiscales_metadata, write_attrs, read_attr, fill_zarr_meta
+)
+from msim.io.reader import open_volume_file, open_label_dataset, read_metadata_json, LazyVolume
+from msim.io.writer import DEFAULT_COMPRESSION, save_multiscale_zarr, create_metadata_json
@@ -0,0 +1,140 @@
+"""
+OME-NGFF metadata and attribute helpers shared by the volume reader and writer.
+"""
+
+import os
+import json
+import h5py
+
+
+def volume_format(path):
+    """
+    Storage format of a volume path: "zarr", "n5" or "hdf5".
+
+    Existing directories are Zarr if they hold Zarr metadata files and N5
+    otherwise; files are HDF5. Paths that do not exist yet are classified by
+    extension (.n5 -> N5, .h5/.hdf5 -> HDF5, anything else -> Zarr).
+    """
+    path = path.rstrip('/')
+    if os.path.isdir(path):
+        zarr_markers = ('.zgroup', '.zarray', '.zattrs')
+        if any(os.path.exists(os.path.join(path, m)) for m in zarr_markers):
+            return "zarr"
+        return "n5"
+    if os.path.isfile(path) or path.endswith(('.h5', '.hdf5')):
+        return "hdf5"
+    if path.endswith('.n5'):
+        return "n5"
+    return "zarr"
+
+
+def multiscales_metadata(n_scales, voxel_size, name="labels"):
+    """
+    OME-NGFF 0.4 `multiscales` entry for a label pyramid built by 2x2x2 pooling.
+
+    Level L is stored at path "L". Its transformations are in micrometers:
+    scale = voxel_size * 2**L and translation = voxel_size * (2**L - 1) / 2,
+    so each coarse voxel is centred on the 2**L fine voxels it pools.
+
+    Args:
+        n_scales: number of pyramid levels
+        voxel_size: (z, y, x) level-0 voxel size in µm
+        name: name of the image
+
+    Returns:
+        dict (the file attribute is a list holding it)
+    """
+    voxel_size = [float(v) for v in voxel_size]
+    datasets = []
+    for lvl in range(n_scales):
+        scale = 2 ** lvl
+        datasets.append({
+            "path": str(lvl),
+            "coordinateTransformations": [
+                {"type": "scale",       "scale": [v * scale for v in voxel_size]},
+                {"type": "translation", "translation": [v * (scale - 1) / 2 for v in voxel_size]}
+            ]
+        })
+    return {
+        "version": "0.4",
+        "name": name,
+        "axes": [
+            {"name": "z", "type": "space", "unit": "micrometer"},
+            {"name": "y", "type": "space", "unit": "micrometer"},
+            {"name": "x", "type": "space", "unit": "micrometer"}
+        ],
+        "datasets": datasets,
+        "type": "mode",
+        "metadata": {
+            "method": "msim.labels.downsample_labels",
+            "description": "2x2x2 block-mode (majority label) pooling",
+            "voxel_size": voxel_size
+        }
+    }
+
+
+def write_attrs(f, attrs):
+    """
+    Store a dict of attributes on a volume file.
+
+    HDF5 attributes cannot hold nested dicts and lists, so there every value
+    is stored as a JSON string (read_attr decodes it again).
+    """
+    for key, value in attrs.items():
+        if isinstance(f, h5py.File):
+            value = json.dumps(value)
+        f.attrs[key] = value
+
+
+def read_attr(f, key, default=None):
+    """Read one attribute written by write_attrs (JSON strings of HDF5 files are decoded)."""
+    if key not in f.attrs:
+        return default
+    value = f.attrs[key]
+    if isinstance(f, h5py.File) and isinstance(value, (str, bytes)):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def fill_zarr_meta(root_group, datasets, output_path, metadata_args, mode='w'):
+    """
+    Fill metadata for the Zarr multiscale datasets and include additional parameters.
+
+    Parameters:
+    - root_group (zarr.Group): The root Zarr group.
+    - datasets (list): List of datasets with their metadata.
+    - output_path (str): Path to save the metadata file.
+    - metadata_args (dict): Metadata arguments for custom configurations.
+    - mode (str): Mode for metadata handling. Default is 'w'.
+    """
+    multiscales = [{
+        "version": "0.4",
+        "name": "example",
+        "axes": [
+            {"name": "z", "type": "space", "unit": "micrometer"},
+            {"name": "y", "type": "space", "unit": "micrometer"},
+            {"name": "x", "type": "space", "unit": "micrometer"}
+        ],
+        "datasets": datasets,
+        "type": "gaussian",
+        "metadata": {
+            "method": "scipy.ndimage.zoom",
+            "args": [True],
+            "kwargs": {
+                "anti_aliasing": True,
+                "preserve_range": True
+            }
+        }
+    }]
+
+    # Update Zarr group attributes
+    if mode == 'w':
+        root_group.attrs.update({"multiscales": multiscales})
+
+        # Save metadata as JSON
+        metadata_file = os.path.join(output_path, 'multiscales.json')
+        with open(metadata_file, 'w') as f:
+            json.dump({"multiscales": multiscales}, f, indent=4)
@@ -0,0 +1,141 @@
+"""
+Reading label volumes (Zarr, N5 or HDF5) and their JSON metadata.
+"""
+
+import json
+import h5py
+import numpy as np
+from msim.io.metadata import volume_format
+
+
+def open_volume_file(volume_path, file_format=None):
+    """
+    Open a Zarr, N5 or HDF5 volume file (format from metadata.volume_format by default).
+
+    Returns:
+        z5py.File or h5py.File
+    """
+    file_format = file_format or volume_format(volume_path)
+    if file_format == "hdf5":
+        return h5py.File(volume_path, 'r')
+    import z5py
+    return z5py.File(volume_path, use_zarr_format=(file_format == "zarr"))
+
+
+def open_label_dataset(volume_path, scale_key="0"):
+    """
+    Open the label dataset of a Zarr, N5 or HDF5 volume without reading it.
+
+    Labels are stored at `scale_key`, or at `scale_key/labels` for the N5
+    group layout.
+
+    Returns:
+        (file, dataset)
+    """
+    f = open_volume_file(volume_path)
+    if scale_key not in f:
+        raise KeyError(f"{volume_path} has no scale level '{scale_key}'")
+    dataset = f[scale_key]
+    if not hasattr(dataset, 'shape'):  # N5 layout: group with a 'labels' dataset
+        dataset = dataset['labels']
+    return f, dataset
+
+
+def read_metadata_json(metadata_path):
+    """
+    Read the simulation metadata written by writer.create_metadata_json.
+
+    Files without a "lookup" entry are treated as a bare lookup table.
+
+    Returns:
+        voxel_size: [z, y, x] level-0 voxel size in µm
+        lookup: dict {label (str): material}
+    """
+    with open(metadata_path, 'r') as f:
+        meta = json.load(f)
+    return meta.get("voxel_size", [1.0, 1.0, 1.0]), meta.get("lookup", meta)
+
+
+class LazyVolume:
+    """
+    Read-only (nz, ny, nx) label volume read from a chunked dataset on demand.
+
+    Data is read in z-slabs aligned to the dataset chunks (slab_size is
+    rounded to a multiple of the chunk depth), and the last slab read is
+    cached so slice-by-slice access (projection, dose) decodes each chunk
+    once. Indexing with [z] or [z0:z1] returns NumPy arrays; np.asarray()
+    reads the whole volume (e.g. for rotation).
+
+    Args:
+        dataset: z5py / h5py dataset (anything with shape, dtype, chunks, slicing)
+        slab_size: z-slices per read (default: the chunk depth)
+        convert: optional callable applied to every block read (e.g. labels.LabelRemap)
+        dtype: dtype of the converted blocks (default: the dataset dtype)
+    """
+
+    def __init__(self, dataset, slab_size=None, convert=None, dtype=None):
+        self.dataset = dataset
+        self.shape = tuple(int(n) for n in dataset.shape)
+        self.ndim = len(self.shape)
+        chunk_z = int((getattr(dataset, 'chunks', None) or self.shape)[0])
+        slab_size = int(slab_size or chunk_z)
+        self.slab_size = max(chunk_z, slab_size // chunk_z * chunk_z)
+        self.convert = convert
+        self.dtype = np.dtype(dtype or dataset.dtype)
+        self._slab_start = None
+        self._slab = None
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _read(self, z0, z1):
+        block = self.dataset[z0:z1]
+        if self.convert is not None:
+            return self.convert(block)
+        return block.astype(self.dtype, copy=False)
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            head, rest = index[0], index[1:]
+            block = self[head]
+            return block[rest] if isinstance(head, (int, np.integer)) else block[(slice(None),) + rest]
+        if isinstance(index, slice):
+            z0, z1, step = index.indices(self.shape[0])
+            return self._read(z0, max(z0, z1))[::step]
+
+        iz = int(index)
+        if iz < 0:
+            iz += self.shape[0]
+        if not 0 <= iz < self.shape[0]:
+            raise IndexError(f"z index {index} out of range for {self.shape[0]} slices")
+        start = iz // self.slab_size * self.slab_size
+        if start != self._slab_start:
+            self._slab = self._read(start, min(start + self.slab_size, self.shape[0]))
+            self._slab_start = start
+        return self._slab[iz - start]
+
+    def iter_slabs(self):
+        """Yield (z0, z1, labels[z0:z1]) over chunk-aligned z-slabs."""
+        for z0 in range(0, self.shape[0], self.slab_size):
+            z1 = min(z0 + self.slab_size, self.shape[0])
+            yield z0, z1, self._read(z0, z1)
+
+    def __array__(self, dtype=None, copy=None):
+        out = np.empty(self.shape, dtype=self.dtype)
+        for z0, z1, slab in self.iter_slabs():
+            out[z0:z1] = slab
+        return out if dtype is None else out.astype(dtype, copy=False)
+
+    def read(self):
+        """Whole volume as a NumPy array."""
+        return np.asarray(self)
+
+    def min(self):
+        return min(slab.min() for _, _, slab in self.iter_slabs())
+
+    def max(self):
+        return max(slab.max() for _, _, slab in self.iter_slabs())
@@ -0,0 +1,245 @@
+"""
+Writing multiscale label volumes (Zarr, N5 or HDF5) and their JSON metadata.
+"""
+
+import os
+import json
+import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import h5py
+import numpy as np
+from msim.labels import compact_label_plan, label_ids, iter_label_pyramid
+from msim.io.metadata import volume_format, multiscales_metadata, write_attrs
+
+
+# Default chunk compression: blosc/zstd with byte shuffle (label volumes compress 10-50x)
+DEFAULT_COMPRESSION = {"compression": "blosc", "codec": "zstd", "clevel": 5, "shuffle": 1}
+
+
+class _AlignedSlabWriter:
+    """
+    Collects consecutive z-blocks of one dataset and submits them in whole chunks of z.
+
+    Every submitted write covers its own set of chunks, so writes can run
+    concurrently in a thread pool without two threads touching one chunk.
+    """
+
+    def __init__(self, dataset, chunk_z, submit, axis=0):
+        self.dataset = dataset
+        self.chunk_z = chunk_z
+        self.submit = submit
+        self.axis = axis
+        self.z0 = 0
+        self.blocks = []
+        self.n = 0
+
+    def add(self, z0, block):
+        if not self.blocks:
+            self.z0 = z0
+        self.blocks.append(block)
+        self.n += block.shape[self.axis]
+        full = self.n // self.chunk_z * self.chunk_z
+        if full:
+            data = self.blocks[0] if len(self.blocks) == 1 else np.concatenate(self.blocks, axis=self.axis)
+            self._write(self.z0, data.take(range(full), axis=self.axis) if full < self.n else data)
+            rest = data.take(range(full, self.n), axis=self.axis) if full < self.n else None
+            self.blocks = [rest] if rest is not None else []
+            self.z0 += full
+            self.n -= full
+
+    def flush(self):
+        if self.blocks:
+            data = self.blocks[0] if len(self.blocks) == 1 else np.concatenate(self.blocks, axis=self.axis)
+            self._write(self.z0, data)
+            self.blocks = []
+            self.n = 0
+
+    def _write(self, z0, data):
+        index = (slice(None),) * self.axis + (slice(z0, z0 + data.shape[self.axis]),)
+        self.submit(self.dataset, index, data)
+
+
+def _hdf5_compression(compression):
+    """h5py dataset options for z5py-style compression options (blosc is not built into HDF5: gzip)."""
+    if compression.get("compression", "raw") == "raw":
+        return {}
+    return {
+        "compression": "gzip",
+        "compression_opts": min(int(compression.get("clevel", 4)), 9),
+        "shuffle": bool(compression.get("shuffle", 0)),
+    }
+
+
+def _create_dataset(group, name, shape, dtype, chunks, compression):
+    if isinstance(group, (h5py.File, h5py.Group)):
+        return group.create_dataset(name, shape=shape, dtype=dtype, chunks=chunks,
+                                    **_hdf5_compression(compression))
+    return group.create_dataset(name=name, shape=shape, dtype=dtype, chunks=chunks, **compression)
+
+
+def save_multiscale_zarr(
+    data,
+    codes,
+    out_dir,
+    voxel_size=(0.25, 0.25, 0.1),
+    n_scales=3,
+    base_chunk=(64, 64, 64),
+    logger=None,
+    fractions=False,
+    compression=None,
+    n_threads=None,
+    file_format=None
+):
+    """
+    Save a 3D volume as a multiscale Zarr file with Neuroglancer-compatible metadata.
+
+    Coarser levels use 2x2x2 block-mode (majority label) pooling, and all
+    levels are built in one streaming pass over z-slabs, so `data` may be a
+    lazily read volume (reader.LazyVolume) larger than memory.
+
+    Chunks are compressed (blosc/zstd with shuffle by default) and written by
+    a thread pool, all levels concurrently, in chunk-aligned slabs.
+
+    The same layout is written as N5 (.n5) or HDF5 (.h5/.hdf5) depending on
+    the output path: level L at "L", OME-NGFF `multiscales` metadata and the
+    `lookup` table as attributes.
+
+    Parameters:
+    - data: 3D NumPy label array to save (e.g., tiled volume); stored in the
+      smallest unsigned dtype that fits, with sparse IDs remapped to 0..n-1
+      (the remap is saved as the 'label_remap' attribute {original: stored})
+    - codes: dict mapping label names to integer codes (for lookup metadata)
+    - out_dir: target path (e.g., 'chip_model.zarr', 'chip_model.n5', 'chip_model.h5')
+    - voxel_size: tuple of 3 floats (z, y, x) voxel size in µm
+    - n_scales: number of pyramid levels (default: 3)
+    - base_chunk: chunk size to use for Zarr compression (default: (64, 64, 64))
+    - logger: optional logger for output messages
+    - fractions: also store, for every level >= 1, the fraction of each label
+      in each voxel as fractions/<level> (n_labels, nz, ny, nx) float32
+    - compression: z5py compression options (default: DEFAULT_COMPRESSION;
+      {"compression": "raw"} for uncompressed chunks; HDF5 uses gzip instead of blosc)
+    - n_threads: writer threads (default: all cores; HDF5 writes are serialized by h5py)
+    - file_format: "zarr", "n5" or "hdf5" (default: from the extension of out_dir)
+    """
+    file_format = file_format or volume_format(out_dir)
+
+    # Delete existing output if present
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    elif os.path.exists(out_dir):
+        os.remove(out_dir)
+
+    # Open output root
+    if file_format == "hdf5":
+        f = h5py.File(out_dir, 'w')
+    else:
+        import z5py
+        f = z5py.File(out_dir, mode="a", use_zarr_format=(file_format == "zarr"))
+
+    # Compact label dtype; codes follow the remap if IDs are sparse
+    ids = label_ids(data)
+    dtype, remap_table = compact_label_plan(ids, {str(v): k for k, v in codes.items()})
+    remap = None
+    if remap_table is not None:
+        remap = remap_table.as_dict()
+        codes = {k: remap[int(v)] for k, v in codes.items()}
+        convert = remap_table
+        max_label = len(remap_table.ids) - 1
+    else:
+        convert = lambda block: block.astype(dtype, copy=False)
+        max_label = max([int(ids[-1]) if ids.size else 0] + [int(v) for v in codes.values()])
+    n_fractions = max_label + 1 if fractions else 0
+
+    # Level shapes: ceil(n / 2) per axis and level
+    shapes = [tuple(int(n) for n in data.shape)]
+    for _ in range(1, n_scales):
+        shapes.append(tuple((n + 1) // 2 for n in shapes[-1]))
+
+    compression = dict(DEFAULT_COMPRESSION if compression is None else compression)
+    n_threads = 1 if file_format == "hdf5" else (n_threads or os.cpu_count() or 1)
+
+    level_ds = {}
+    fraction_ds = {}
+    for lvl, shape in enumerate(shapes):
+        path = str(lvl)
+        chunks = tuple(min(c, s) for c, s in zip(base_chunk, shape))
+        level_ds[lvl] = _create_dataset(f, path, shape, dtype.name, chunks, compression)
+        if n_fractions and lvl > 0:
+            fraction_ds[lvl] = _create_dataset(f.require_group('fractions'), path, (n_fractions,) + shape,
+                                               'float32', (1,) + chunks, compression)
+
+    # One streaming pass over z-slabs; chunk-aligned slabs of every level are
+    # compressed and written in the thread pool while the next slab is built
+    in_flight = deque()
+
+    def write(dataset, index, block):
+        dataset[index] = block
+
+    try:
+        with ThreadPoolExecutor(max_workers=n_threads) as pool:
+            def submit(dataset, index, block):
+                in_flight.append(pool.submit(write, dataset, index, block))
+                while len(in_flight) > 2 * n_threads:  # bound the memory held by queued slabs
+                    in_flight.popleft().result()
+
+            writers = {lvl: _AlignedSlabWriter(ds, ds.chunks[0], submit) for lvl, ds in level_ds.items()}
+            fraction_writers = {lvl: _AlignedSlabWriter(ds, ds.chunks[1], submit, axis=1)
+                                for lvl, ds in fraction_ds.items()}
+
+            for lvl, z0, block, frac in iter_label_pyramid(data, n_scales, slab_size=base_chunk[0],
+                                                           convert=convert, n_fraction_labels=n_fractions):
+                writers[lvl].add(z0, block)
+                if frac is not None:
+                    fraction_writers[lvl].add(z0, frac)
+
+            for writer in list(writers.values()) + list(fraction_writers.values()):
+                writer.flush()
+            while in_flight:
+                in_flight.popleft().result()
+
+        # Add metadata
+        multiscale_meta = multiscales_metadata(n_scales, voxel_size)
+        attrs = {
+            'lookup': {str(v): {'alias': k} for k, v in codes.items()},
+            'voxel_size': [float(v) for v in voxel_size],
+            'multiscales': [multiscale_meta],
+        }
+        if remap:
+            attrs['label_remap'] = {str(k): v for k, v in remap.items()}
+        if n_fractions:
+            attrs['fraction_labels'] = n_fractions
+        write_attrs(f, attrs)
+    finally:
+        if file_format == "hdf5":
+            f.close()
+
+    # Also write JSON file for HTTP-serving compatibility
+    if file_format != "hdf5":
+        with open(os.path.join(out_dir, "multiscale.json"), "w") as fjson:
+            json.dump([multiscale_meta], fjson, indent=2)
+
+    if logger:
+        logger.info(f"Saved Neuroglancer-ready multiscale {file_format} → {out_dir}")
+
+
+def create_metadata_json(lookup_dict, voxel_size, output_path, regions=False):
+    """
+    Create a separate JSON metadata file for simulation compatibility.
+
+    Args:
+        lookup_dict: dict {label (str): material}
+        voxel_size: (z, y, x) level-0 voxel size in µm
+        output_path: JSON file to write
+        regions: also list one region {"ID", "GroupID"} per label
+    """
+    metadata = {
+        "voxel_size": list(voxel_size),
+        "lookup": lookup_dict
+    }
+    if regions:
+        metadata["regions"] = [{"ID": int(key), "GroupID": int(key)}
+                               for key in sorted(lookup_dict.keys(), key=lambda x: int(x))]
+
+    with open(output_path, 'w') as f:
+        json.dump(metadata, f, indent=2)
@@ -0,0 +1,222 @@
+"""
+Compact storage of label volumes.
+
+Label volumes are stored in the smallest unsigned dtype that holds every
+label (uint8 below 256 labels, uint16 below 65536). When the label IDs are
+sparse (e.g. brain atlas IDs in the thousands but only a few hundred
+regions), they are remapped to consecutive IDs and the remap table
+{original: compact} is kept next to the volume so the lookup can follow.
+
+Pyramid levels are built by 2x2x2 block-mode (majority) pooling rather than
+striding, so thin structures survive downsampling.
+"""
+
+import numpy as np
+
+
+def label_dtype(max_label):
+    """Smallest unsigned integer dtype that holds labels 0..max_label."""
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_label <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+
+def label_ids(volume_labels):
+    """
+    Sorted unique labels of a volume (bincount presence for small IDs, np.unique otherwise).
+
+    Volumes exposing iter_slabs() (io.LazyVolume) are scanned slab by slab.
+    """
+    if hasattr(volume_labels, 'iter_slabs'):
+        ids = np.zeros(0, dtype=np.int64)
+        for _, _, slab in volume_labels.iter_slabs():
+            ids = np.union1d(ids, label_ids(slab))
+        return ids
+    volume_labels = np.asarray(volume_labels)
+    if volume_labels.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    lo, hi = int(volume_labels.min()), int(volume_labels.max())
+    if lo < 0:
+        raise ValueError(f"Negative labels are not supported (min label {lo})")
+    if hi < 2**24:
+        present = np.zeros(hi + 1, dtype=bool)
+        present[volume_labels.ravel()] = True
+        return np.flatnonzero(present)
+    return np.unique(volume_labels).astype(np.int64)
+
+
+class LabelRemap:
+    """Vectorized mapping of sorted label IDs to 0..n-1 in a compact dtype."""
+
+    def __init__(self, ids, dtype):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.dtype = np.dtype(dtype)
+        self.table = None
+        if self.ids.size and self.ids[-1] < 2**24:
+            self.table = np.zeros(int(self.ids[-1]) + 1, dtype=self.dtype)
+            self.table[self.ids] = np.arange(self.ids.size, dtype=self.dtype)
+
+    def __call__(self, labels):
+        if self.table is not None:
+            return np.take(self.table, labels)
+        return np.searchsorted(self.ids, labels).astype(self.dtype)
+
+    def as_dict(self):
+        """{original label: compact label}"""
+        return {int(old): new for new, old in enumerate(self.ids)}
+
+
+def compact_label_plan(ids, lookup=None):
+    """
+    Choose the compact dtype for a label set.
+
+    IDs are remapped to 0..n-1 (in sorted order) only when that gives a
+    smaller dtype than the largest ID; labels named in `lookup` keep an ID
+    even if absent from the volume. Label 0 is always part of the set, so
+    it stays 0 and no material is remapped onto the background (0 is also
+    the fill value of rotated volumes).
+
+    Args:
+        ids: sorted unique labels present in the volume
+        lookup: optional dict {label (str): material}
+
+    Returns:
+        dtype: compact dtype
+        remap: LabelRemap, or None if the labels are only cast
+    """
+    ids = np.union1d(np.asarray(ids, dtype=np.int64), [0])
+    if lookup:
+        ids = np.union1d(ids, np.array([int(k) for k in lookup], dtype=np.int64))
+    max_label = int(ids[-1])
+    dtype = label_dtype(max_label)
+    dense_dtype = label_dtype(max(ids.size - 1, 0))
+    if dense_dtype.itemsize >= dtype.itemsize:
+        return dtype, None
+    return dense_dtype, LabelRemap(ids, dense_dtype)
+
+
+def compact_labels(volume_labels, lookup=None):
+    """
+    Convert a label volume to its most compact unsigned dtype (see compact_label_plan).
+
+    Args:
+        volume_labels: (nz, ny, nx) non-negative integer labels
+        lookup: optional dict {label (str): material} to remap with the volume
+
+    Returns:
+        labels: volume in the compact dtype (the input itself if already compact)
+        lookup: lookup with remapped keys (unchanged without remapping)
+        remap: dict {original label: compact label}, or None without remapping
+    """
+    dtype, remap = compact_label_plan(label_ids(volume_labels), lookup)
+    if remap is None:
+        labels = volume_labels if volume_labels.dtype == dtype else volume_labels.astype(dtype)
+        return labels, lookup, None
+    remap_dict = remap.as_dict()
+    return remap(volume_labels), remap_lookup(lookup, remap_dict), remap_dict
+
+
+def remap_lookup(lookup, remap):
+    """Re-key a {label (str): material} lookup with a {original: compact} remap table."""
+    if lookup is None or not remap:
+        return lookup
+    return {str(remap[int(k)]): v for k, v in lookup.items() if int(k) in remap}
+
+
+def _blocks(a):
+    """
+    View the last three axes of `a` as 2x2x2 blocks: (..., nz/2, ny/2, nx/2, 8).
+
+    Odd sizes are edge-padded, so the block grid is ceil(n / 2) per axis.
+    """
+    lead = a.shape[:-3]
+    nz, ny, nx = a.shape[-3:]
+    pad = [(0, 0)] * len(lead) + [(0, nz % 2), (0, ny % 2), (0, nx % 2)]
+    if any(p[1] for p in pad):
+        a = np.pad(a, pad, mode='edge')
+    bz, by, bx = (nz + 1) // 2, (ny + 1) // 2, (nx + 1) // 2
+    k = len(lead)
+    a = a.reshape(lead + (bz, 2, by, 2, bx, 2))
+    order = tuple(range(k)) + (k, k + 2, k + 4, k + 1, k + 3, k + 5)
+    return a.transpose(order).reshape(lead + (bz, by, bx, 8))
+
+
+def downsample_labels(labels):
+    """
+    2x2x2 block-mode (majority) downsampling of a label volume.
+
+    Each output voxel gets the most frequent label of its block; ties go to
+    the first voxel of the block in (z, y, x) order, i.e. the voxel that
+    labels[::2, ::2, ::2] keeps. Odd sizes are edge-padded, so the output
+    shape is ceil(n / 2) per axis as with striding.
+
+    Args:
+        labels: (nz, ny, nx) label array
+
+    Returns:
+        (ceil(nz/2), ceil(ny/2), ceil(nx/2)) labels with the input dtype
+    """
+    blocks = _blocks(np.asarray(labels))
+    best = blocks[..., 0].copy()
+    best_count = np.zeros(best.shape, dtype=np.uint8)
+    for i in range(8):
+        candidate = blocks[..., i]
+        count = (blocks == candidate[..., None]).sum(axis=-1, dtype=np.uint8)
+        better = count > best_count
+        best[better] = candidate[better]
+        best_count[better] = count[better]
+    return best
+
+
+def label_fractions(labels, n_labels):
+    """
+    Fraction of each label 0..n_labels-1 in every 2x2x2 block.
+
+    Returns:
+        (n_labels, ceil(nz/2), ceil(ny/2), ceil(nx/2)) float32
+    """
+    blocks = _blocks(np.asarray(labels))
+    return np.stack([(blocks == c).mean(axis=-1, dtype=np.float32) for c in range(n_labels)])
+
+
+def downsample_fractions(fractions):
+    """2x2x2 block mean of a (n_labels, nz, ny, nx) fraction array (next pyramid level)."""
+    return _blocks(fractions).mean(axis=-1, dtype=np.float32)
+
+
+def iter_label_pyramid(volume_labels, n_scales, slab_size=64, convert=None, n_fraction_labels=0):
+    """
+    Build all pyramid levels in one streaming pass over z-slabs.
+
+    Slabs are a multiple of 2**(n_scales-1) slices thick, so each slab maps
+    to whole slabs of every coarser level and only one slab per level is in
+    memory at a time.
+
+    Args:
+        volume_labels: (nz, ny, nx) labels, array or io.LazyVolume
+        n_scales: number of levels (level 0 is the input)
+        slab_size: level-0 slices per slab (rounded up to a multiple of 2**(n_scales-1))
+        convert: optional callable applied to each level-0 slab (e.g. LabelRemap)
+        n_fraction_labels: if > 0, also yield the fractions of labels
+            0..n_fraction_labels-1 for levels >= 1
+
+    Yields:
+        (level, z_offset, labels_block, fractions_block or None)
+    """
+    step = 2 ** (n_scales - 1)
+    slab_size = max(step, -(-int(slab_size) // step) * step)
+    nz = volume_labels.shape[0]
+    for z0 in range(0, nz, slab_size):
+        block = np.asarray(volume_labels[z0:min(z0 + slab_size, nz)])
+        if convert is not None:
+            block = convert(block)
+        yield 0, z0, block, None
+
+        fractions = None
+        for level in range(1, n_scales):
+            if n_fraction_labels:
+                fractions = (label_fractions(block, n_fraction_labels) if fractions is None
+                             else downsample_fractions(fractions))
+            block = downsample_labels(block)
+            yield level, z0 >> level, block, fractions
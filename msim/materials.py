@@ -0,0 +1,285 @@
+"""
+Material optical constants and label -> material property tables.
+
+Optical constants from xraylib are cached by `MaterialDatabase` (in-process
+LRU plus an on-disk SQLite store), and a label volume is turned into property
+maps (δ, μ) by a single gather into a dense table indexed by label, instead of
+one boolean mask per lookup entry.
+"""
+
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+import xraylib
+
+
+def material_formula(composition):
+    """Build the xraylib formula string for a {element: amount} composition."""
+    return ''.join(f"{el}{amt}" for el, amt in composition.items())
+
+
+def canonical_formula(composition):
+    """Formula string with elements in sorted order, so equal materials share a key."""
+    return material_formula(dict(sorted(composition.items())))
+
+
+def default_cache_path():
+    """On-disk cache location: $MSIM_CACHE_DIR or ~/.cache/msim."""
+    cache_dir = os.environ.get("MSIM_CACHE_DIR",
+                               os.path.join(os.path.expanduser("~"), ".cache", "msim"))
+    return os.path.join(cache_dir, "materials.sqlite")
+
+
+class MaterialDatabase:
+    """
+    Cache of xraylib optical constants keyed by (canonical formula, density, energy).
+
+    Lookups hit an in-process LRU first, then the SQLite file at `cache_path`,
+    and only call xraylib on a miss. Set cache_path=None for a memory-only cache.
+
+    Each entry is a dict with:
+        delta     : 1 - Re(n)
+        cs_total  : total cross-section (cm²/g)
+        cs_rayl   : Rayleigh cross-section (cm²/g)
+        cs_energy : energy-absorption cross-section (cm²/g)
+    """
+
+    FIELDS = ('delta', 'cs_total', 'cs_rayl', 'cs_energy')
+
+    def __init__(self, cache_path=None, maxsize=4096):
+        self.cache_path = cache_path
+        self.maxsize = maxsize
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._xraylib_ready = False
+        self.hits = 0
+        self.misses = 0
+
+        if cache_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+                self._conn = sqlite3.connect(cache_path, timeout=30, check_same_thread=False)
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS constants ("
+                    "formula TEXT, density REAL, energy REAL, "
+                    "delta REAL, cs_total REAL, cs_rayl REAL, cs_energy REAL, "
+                    "PRIMARY KEY (formula, density, energy))"
+                )
+                self._conn.commit()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Warning: material cache {cache_path} unavailable, using memory only: {e}")
+                self._conn = None
+
+    def get(self, composition, density, energy_kev):
+        """
+        Optical constants for one material at one energy.
+
+        Args:
+            composition: dict {element: amount}
+            density: mass density (g/cm³)
+            energy_kev: X-ray energy in keV
+
+        Returns:
+            dict with the fields listed in MaterialDatabase.FIELDS
+        """
+        key = (canonical_formula(composition), float(density), float(energy_kev))
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return self._lru[key]
+
+            entry = self._read_disk(key)
+            if entry is None:
+                self.misses += 1
+                entry = self._compute(*key)
+                self._write_disk(key, entry)
+            else:
+                self.hits += 1
+
+            self._lru[key] = entry
+            if len(self._lru) > self.maxsize:
+                self._lru.popitem(last=False)
+            return entry
+
+    def _compute(self, formula, density, energy_kev):
+        if not self._xraylib_ready:
+            xraylib.XRayInit()
+            self._xraylib_ready = True
+        return {
+            'delta': 1 - xraylib.Refractive_Index_Re(formula, energy_kev, density),
+            'cs_total': xraylib.CS_Total_CP(formula, energy_kev),
+            'cs_rayl': xraylib.CS_Rayl_CP(formula, energy_kev),
+            'cs_energy': xraylib.CS_Energy_CP(formula, energy_kev),
+        }
+
+    def _read_disk(self, key):
+        if self._conn is None:
+            return None
+        row = self._conn.execute(
+            "SELECT delta, cs_total, cs_rayl, cs_energy FROM constants "
+            "WHERE formula=? AND density=? AND energy=?", key
+        ).fetchone()
+        return None if row is None else dict(zip(self.FIELDS, row))
+
+    def _write_disk(self, key, entry):
+        if self._conn is None:
+            return
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO constants VALUES (?, ?, ?, ?, ?, ?, ?)",
+                key + tuple(entry[f] for f in self.FIELDS)
+            )
+            self._conn.commit()
+        except sqlite3.Error as e:
+            print(f"Warning: could not write material cache {self.cache_path}: {e}")
+
+
+_DATABASES = {}
+
+
+def get_material_database(config=None):
+    """
+    Return the shared MaterialDatabase for config["MATERIAL_CACHE"].
+
+    MATERIAL_CACHE is a path to the SQLite file; it defaults to
+    default_cache_path(), and an empty string or null disables the disk cache.
+    """
+    config = config or {}
+    path = config.get("MATERIAL_CACHE", default_cache_path())
+    path = path or None
+    if path not in _DATABASES:
+        _DATABASES[path] = MaterialDatabase(path)
+    return _DATABASES[path]
+
+
+def property_table(lookup, config, energy_kev=None):
+    """
+    PropertyTable of a lookup for a simulation config.
+
+    Uses the material database of config["MATERIAL_CACHE"] (see
+    get_material_database) and config["ENERGY_KEV"] unless energy_kev is
+    given. Invalid materials raise unless config["SKIP_INVALID_MATERIALS"]
+    is set, in which case they are simulated as vacuum.
+    """
+    config = config or {}
+    energy_kev = config["ENERGY_KEV"] if energy_kev is None else energy_kev
+    return PropertyTable(lookup, energy_kev, get_material_database(config),
+                         strict=not config.get("SKIP_INVALID_MATERIALS", False))
+
+
+class PropertyTable:
+    """
+    Dense per-label material properties at one energy.
+
+    Each column is a float32 array indexed by label. One extra zero entry is
+    kept past the largest label of the lookup, so labels that are missing
+    from the lookup (or larger than all of its keys) map to vacuum.
+
+    A material whose properties cannot be calculated (e.g. an unknown
+    element) raises ValueError; with strict=False it is reported and
+    treated as vacuum instead.
+
+    Columns:
+        delta    : refractive index decrement δ
+        mu_abs   : absorption coefficient (1/m), total minus Rayleigh
+        mu_scat  : Rayleigh scattering coefficient (1/m)
+        mu_total : total linear attenuation (1/cm)
+        mu_en    : linear energy absorption (1/cm)
+        density  : mass density (g/cm³)
+    """
+
+    COLUMNS = ('delta', 'mu_abs', 'mu_scat', 'mu_total', 'mu_en', 'density')
+
+    def __init__(self, lookup, energy_kev, database=None, strict=True):
+        self.energy_kev = energy_kev
+        database = database or get_material_database()
+        labels = [int(k) for k in lookup.keys()]
+        size = (max(labels) if labels else 0) + 2
+        self.columns = {name: np.zeros(size, dtype='float32') for name in self.COLUMNS}
+
+        for k, props in lookup.items():
+            composition = props.get('composition', {})
+            density = props.get('density', 0.0)
+
+            # Skip empty compositions (vacuum/air)
+            if not composition or density == 0.0:
+                continue
+
+            try:
+                constants = database.get(composition, density, energy_kev)
+            except Exception as e:
+                message = f"Could not calculate properties for {k} ({material_formula(composition)}): {e}"
+                if strict:
+                    raise ValueError(message) from e
+                print(f"Warning: {message}")
+                continue
+            delta = constants['delta']
+            cs_tot = constants['cs_total']     # cm²/g
+            cs_rayl = constants['cs_rayl']     # cm²/g
+            cs_en = constants['cs_energy']     # cm²/g
+
+            label = int(k)
+            self.columns['delta'][label] = delta
+            self.columns['mu_abs'][label] = density * (cs_tot - cs_rayl) * 100
+            self.columns['mu_scat'][label] = density * cs_rayl * 100
+            self.columns['mu_total'][label] = cs_tot * density
+            self.columns['mu_en'][label] = cs_en * density
+            self.columns['density'][label] = density
+
+    def __len__(self):
+        return len(self.columns['delta'])
+
+    def gather(self, volume_labels, name):
+        """
+        Map a label array to one property in a single pass.
+
+        Args:
+            volume_labels: integer (or integer-valued float) label array of any shape
+            name: column name (see PropertyTable.COLUMNS)
+
+        Returns:
+            float32 array with the shape of volume_labels
+        """
+        volume_labels = np.asarray(volume_labels)
+        if volume_labels.dtype.kind == 'f':
+            # float32 label buffers (rotation of > 65535 labels) hold exact integers
+            volume_labels = volume_labels.astype(np.intp)
+        return np.take(self.columns[name], volume_labels, mode='clip')
+
+    def transmission(self, k0, dz, phase=True, absorption=True):
+        """
+        Complex transmission of one slice of thickness dz, per label.
+
+        T = exp(i k0 δ dz) · exp(-μ_abs dz / 2), so a slice is applied to the
+        wavefield with one gather and one multiply instead of two complex
+        exponentials per voxel.
+
+        Args:
+            k0: vacuum wavenumber (1/m)
+            dz: slice thickness (m)
+            phase, absorption: include the phase / absorption factor
+
+        Returns:
+            complex128 array indexed by label (same length as the columns)
+        """
+        exponent = np.zeros(len(self), dtype=np.complex128)
+        if phase:
+            exponent += 1j * k0 * self.columns['delta'].astype(np.float64) * dz
+        if absorption:
+            exponent -= 0.5 * self.columns['mu_abs'].astype(np.float64) * dz
+        return np.exp(exponent)
+
+    def scatter_tables(self, dz):
+        """
+        Rayleigh scattering of one slice of thickness dz, per label.
+
+        Returns:
+            p_scat: float64 probability that a photon scatters, 1 - exp(-μ_scat dz)
+            amplitude: float64 amplitude kept by the coherent wave, exp(-μ_scat dz / 2)
+        """
+        mu_dz = self.columns['mu_scat'].astype(np.float64) * dz
+        return -np.expm1(-mu_dz), np.exp(-0.5 * mu_dz)
@@ -0,0 +1,199 @@
+"""
+Material-decomposed path lengths of projection series.
+
+In the projection approximation a projection depends on the volume only
+through ∫δ, ∫μ_abs and ∫μ_scat along each ray, and each of them is a sum
+over the labels of the ray of (property × path length). Storing the path
+length of every label in every ray, per angle, lets a whole series be
+re-rendered for another lookup or ENERGY_KEV with one sparse contraction
+per property, without rotating or propagating through the volume again.
+"""
+
+import numpy as np
+from msim.materials import property_table
+from msim.physics import projection_from_line_integrals, use_projection_approximation
+from msim.propagator import get_propagator_plan
+from msim.geometry import angle_rng
+
+# Slabs with at most this many labels are counted one label at a time
+_DENSE_LABELS = 32
+
+
+def label_path_lengths(volume_labels, slab_size=32):
+    """
+    Number of voxels of each label along every ray (z) of a label volume.
+
+    Only the labels present in a ray are stored (CSR layout over the
+    row-major rays y * nx + x).
+
+    Args:
+        volume_labels: (nz, ny, nx) labels, array or slice provider (see physics.projection)
+        slab_size: z-slices read per pass
+
+    Returns:
+        indptr: (ny*nx + 1,) int64; ray r holds entries indptr[r]:indptr[r+1]
+        labels: (nnz,) int64 labels of each ray, ascending
+        counts: (nnz,) int64 voxels of that label (path length = count · dz)
+    """
+    nz, ny, nx = volume_labels.shape
+    n_rays = ny * nx
+    rays = np.arange(n_rays, dtype=np.int64)
+    keys, counts = [], []
+    for z0 in range(0, nz, slab_size):
+        slab = np.asarray(volume_labels[z0:min(z0 + slab_size, nz)])
+        if slab.dtype.kind == 'f':
+            slab = slab.astype(np.intp)  # float32 buffers (> 65535 labels) hold exact integers
+        slab = slab.reshape(-1, n_rays)
+        if slab.dtype.itemsize <= 2:
+            present = np.flatnonzero(np.bincount(slab.ravel()))
+        else:
+            present = np.unique(slab)
+        if len(present) <= _DENSE_LABELS:
+            for label in present:
+                count = np.count_nonzero(slab == label, axis=0)
+                hit = np.flatnonzero(count)
+                keys.append(int(label) * n_rays + hit)
+                counts.append(count[hit])
+        else:
+            slab_keys, slab_counts = np.unique(slab.astype(np.int64) * n_rays + rays, return_counts=True)
+            keys.append(slab_keys)
+            counts.append(slab_counts)
+
+    if not keys:
+        return np.zeros(n_rays + 1, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # Merge the slabs (keys are label-major), then order by ray
+    keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+    counts = np.bincount(inverse.ravel(), weights=np.concatenate(counts)).astype(np.int64)
+    labels, ray = np.divmod(keys, n_rays)
+    order = np.argsort(ray, kind='stable')
+    indptr = np.zeros(n_rays + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ray, minlength=n_rays), out=indptr[1:])
+    return indptr, labels[order], counts[order]
+
+
+class PathLengthCache:
+    """
+    Per-angle label path lengths of a projection series.
+
+    Entries (see label_path_lengths) are kept in memory, or in an HDF5 group
+    as "<index>/indptr", "<index>/labels" and "<index>/counts"; a cache on a
+    group that already holds entries (e.g. a resumed scan) keeps them.
+    simulate_projection_series() fills it (its `path_lengths` argument) and
+    render_projection_series() re-renders the series from it.
+
+    Args:
+        volume_shape: (nz, ny, nx) of the projected (rotated) volumes
+        voxel_size: (dz, dy, dx) in microns
+        group: optional h5py.Group to store the entries in
+    """
+
+    def __init__(self, volume_shape, voxel_size, group=None):
+        self.volume_shape = tuple(int(n) for n in volume_shape)
+        self.voxel_size = tuple(float(v) for v in voxel_size)
+        self.group = group
+        self._entries = {}
+        if group is not None and 'volume_shape' not in group.attrs:
+            group.attrs['volume_shape'] = self.volume_shape
+            group.attrs['voxel_size_um'] = self.voxel_size
+
+    @classmethod
+    def open(cls, group):
+        """Cache stored in an HDF5 group by a previous series."""
+        return cls(group.attrs['volume_shape'], group.attrs['voxel_size_um'], group=group)
+
+    def __contains__(self, index):
+        if self.group is not None:
+            return str(index) in self.group
+        return index in self._entries
+
+    def __len__(self):
+        return len(self.indices())
+
+    def indices(self):
+        """Sorted angle indices held in the cache."""
+        if self.group is not None:
+            return sorted(int(k) for k in self.group.keys())
+        return sorted(self._entries)
+
+    def add(self, index, rotated_labels):
+        """Store the path lengths of the angle at position `index` of the series."""
+        self.store(index, *label_path_lengths(rotated_labels))
+
+    def store(self, index, indptr, labels, counts):
+        """Store path lengths already computed with label_path_lengths (e.g. in a worker process)."""
+        labels = labels.astype(np.uint16 if labels.size == 0 or labels.max() < 2**16 else np.uint32)
+        counts = counts.astype(np.uint16 if self.volume_shape[0] < 2**16 else np.uint32)
+        if self.group is None:
+            self._entries[index] = (indptr, labels, counts)
+            return
+        if str(index) in self.group:
+            del self.group[str(index)]
+        entry = self.group.create_group(str(index))
+        for name, data in (('indptr', indptr), ('labels', labels), ('counts', counts)):
+            entry.create_dataset(name, data=data, compression='gzip' if data.size else None)
+        self.group.file.flush()
+
+    def get(self, index):
+        """(indptr, labels, counts) of one angle."""
+        if self.group is None:
+            return self._entries[index]
+        entry = self.group[str(index)]
+        return entry['indptr'][...], entry['labels'][...], entry['counts'][...]
+
+    def line_integrals(self, index, table, names=('delta', 'mu_abs', 'mu_scat')):
+        """
+        Line integrals of one angle for a PropertyTable (see physics.projection_from_line_integrals).
+
+        Returns:
+            dict name -> (ny, nx) float64 array of ∫ property dz (property units × m)
+        """
+        _, ny, nx = self.volume_shape
+        indptr, labels, counts = self.get(index)
+        rays = np.repeat(np.arange(ny * nx), np.diff(indptr))
+        dz = self.voxel_size[0] * 1e-6
+        integrals = {}
+        for name in names:
+            weights = np.take(table.columns[name], labels, mode='clip') * counts.astype(np.float64)
+            integrals[name] = np.bincount(rays, weights=weights, minlength=ny * nx).reshape(ny, nx) * dz
+        return integrals
+
+
+def render_projection_series(cache, lookup, config, indices=None, plan=None):
+    """
+    Re-render a projection series from its path lengths.
+
+    Materials (lookup) and energy (config["ENERGY_KEV"]) may differ from the
+    simulated series; each projection costs one sparse contraction per
+    property and one FFT pair to the detector. The result is the projection
+    approximation: exact (up to rounding) for series simulated in it, an
+    approximation of multislice series of thick samples. Noise is seeded per
+    angle from RANDOM_SEED as in simulate_projection_series.
+
+    Args:
+        cache: PathLengthCache of the series
+        lookup: dict mapping label to {composition, density} (labels of the
+                projected volume)
+        config: simulation config (ENERGY_KEV, PAD, DETECTOR_*, ENABLE_*, noise)
+        indices: angle indices to render (default: all in the cache)
+        plan: optional PropagatorPlan of the padded geometry
+
+    Returns:
+        (n, ny, nx) projections in the order of `indices`
+    """
+    indices = cache.indices() if indices is None else list(indices)
+    nz, ny, nx = cache.volume_shape
+    pad = config["PAD"]
+    if plan is None:
+        plan = get_propagator_plan((ny + 2*pad, nx + 2*pad), cache.voxel_size, config)
+    if not use_projection_approximation(plan, nz, config):
+        print(f"Note: λ·T/dx² = {plan.fresnel_error(nz):.2e}; re-rendering in the projection approximation")
+
+    table = property_table(lookup, config)
+    base_seed = config.get("RANDOM_SEED")
+    projections = []
+    for i in indices:
+        integrals = cache.line_integrals(i, table)
+        projections.append(projection_from_line_integrals([integrals], config, plan,
+                                                          rngs=[angle_rng(base_seed, i)])[0])
+    return np.array(projections)
@@ -1,142 +1,398 @@
 import numpy as np
-import cupy as cp
-import cupyx.scipy.signal as cpxsignal
-from scipy.interpolate import interp1d
-import xraylib
+from msim.backend import get_backend
+from msim.materials import property_table, material_formula
+from msim.propagator import get_propagator_plan
 
-def projection(volume_labels, lookup, voxel_size, config):
+def projection(volume_labels, lookup, voxel_size, config, plan=None, rng=None, stats=None):
     """
-    Simulate detector intensity from a rotated label volume—GPU version.
+    Simulate detector intensity from a rotated label volume.
+
+    Runs on the array backend selected by config["BACKEND"] (CuPy or NumPy).
     
     Parameters:
-        volume_labels : (nz, ny, nx) integer labels (NumPy array)
+        volume_labels : (nz, ny, nx) integer labels: a NumPy array, or any
+                        object with .shape and [z] indexing returning (ny, nx)
+                        label slices (e.g. geometry.RotatedVolumeView)
         lookup        : dict mapping label to {composition, density}
         voxel_size    : (dz, dy, dx) in microns (tuple of floats)
         config        : dict containing ENERGY_KEV, DETECTOR_DIST, PAD, ENABLE_*, etc.
+        plan          : optional PropagatorPlan for this geometry; looked up
+                        (and cached) with get_propagator_plan() if omitted
+        rng           : optional numpy.random.RandomState used for all random
+                        numbers (drawn on the host, so a seeded projection is
+                        the same on every backend); the global random state
+                        of the backend if omitted
+        stats         : optional dict of FFT counts (see projection_batch)
 
     Returns:
         I_sim : (ny, nx) simulated detector intensity (NumPy array)
     """
+    return projection_batch([volume_labels], lookup, voxel_size, config, plan=plan, rngs=[rng], stats=stats)[0]
 
-    # --- 1) Compute δ, μ_abs, μ_scat on CPU ---
-    nz, ny, nx = volume_labels.shape
-    delta_cpu   = np.zeros_like(volume_labels, dtype='float32')
-    mu_abs_cpu  = np.zeros_like(volume_labels, dtype='float32')
-    mu_scat_cpu = np.zeros_like(volume_labels, dtype='float32')
-
-    xraylib.XRayInit()
-    energy = config["ENERGY_KEV"]
-    for k, props in lookup.items():        
-        mask    = (volume_labels == int(k))
-        if not np.any(mask):
-            continue
-        
-        composition = props.get('composition', {})
-        density = props.get('density', 0.0)
-        
-        # Skip empty compositions (vacuum/air)
-        if not composition or density == 0.0:
-            continue
-            
-        formula = ''.join(f"{el}{amt}" for el, amt in composition.items())
-
-        δ_val   = 1 - xraylib.Refractive_Index_Re(formula, energy, density)
-        cs_tot  = xraylib.CS_Total_CP(formula, energy)
-        cs_rayl = xraylib.CS_Rayl_CP(formula, energy)
+def projection_batch(volumes, lookup, voxel_size, config, plan=None, rngs=None, stats=None):
+    """
+    Simulate detector intensities of several rotated label volumes at once.
+    
+    Same physics as projection(), but the B wavefields are propagated as one
+    (B, ny, nx) stack, so every slice costs one batched fft2/ifft2 pair (and
+    one batched scatter blur) for all volumes instead of one pair each.
+    
+    Parameters:
+        volumes : sequence of B label volumes of the same shape (see projection)
+        lookup, voxel_size, config, plan : as for projection()
+        rngs    : optional sequence of B RandomStates, one per volume (None
+                  entries use the global random state)
+        stats   : optional dict; 'fft_pairs' and 'skipped_fft_pairs' (per
+                  projection, summed over the batch) are added to it
+    
+    Slices in which every volume holds a single non-scattering label are not
+    propagated one by one (config["SKIP_UNIFORM_SLICES"], default True).
+    With config["MULTISLICE_TOLERANCE"] > 0, consecutive slices are grouped
+    into slabs propagated as one slice while λ·Δz/dx² of the slab stays
+    below the tolerance (see PropagatorPlan.max_slab_slices).
+    
+    When the whole sample is thin enough (see use_projection_approximation),
+    the slices are not propagated at all: the projected phase and absorption
+    form one exit wave, which is propagated to the detector with H_det only.
+    
+    Returns:
+        I_sim : (B, ny, nx) simulated detector intensities (NumPy array)
+    """
 
-        delta_cpu[  mask] = δ_val
-        mu_abs_cpu[ mask] = density * (cs_tot - cs_rayl) * 100
-        mu_scat_cpu[mask] = density * cs_rayl * 100
+    # --- 1) Per-label δ, μ_abs, μ_scat table ---
+    n_batch = len(volumes)
+    rngs = list(rngs) if rngs is not None else [None] * n_batch
+    nz, ny, nx = volumes[0].shape
+    table = property_table(lookup, config)
 
-    # --- 2) Transfer to GPU and pad ---
+    backend = get_backend(config)
+    xp = backend.xp
     pad = config["PAD"]
-    delta_p   = cp.pad(cp.asarray(delta_cpu),   ((0,0),(pad,pad),(pad,pad)), mode='edge')
-    mu_abs_p  = cp.pad(cp.asarray(mu_abs_cpu),  ((0,0),(pad,pad),(pad,pad)), mode='edge')
-    mu_scat_p = cp.pad(cp.asarray(mu_scat_cpu), ((0,0),(pad,pad),(pad,pad)), mode='edge')
     ny_p, nx_p = ny + 2*pad, nx + 2*pad
 
     # voxel sizes (m)
-    dz, dy, dx = [v * 1e-6 for v in voxel_size]
-    
-    # Detector pixel size (user-defined, not voxel size!)
-    detector_pixel_size = config.get("DETECTOR_PIXEL_SIZE", dy)  # Default to voxel size if not specified
-
-    # --- 3) Build propagation kernels on GPU ---
-    # wavenumber
-    k0 = 2 * cp.pi / ((6.62607015e-34 * 2.99792458e8) / (energy*1e3*1.602176634e-19))
-    kx = cp.fft.fftfreq(nx_p, detector_pixel_size) * 2 * cp.pi
-    ky = cp.fft.fftfreq(ny_p, detector_pixel_size) * 2 * cp.pi
-    KX, KY = cp.meshgrid(kx, ky)
-    H_slice = cp.exp(-1j * (KX**2 + KY**2) * dz / (2*k0))
-    H_det   = cp.exp(-1j * (KX**2 + KY**2) * config["DETECTOR_DIST"] / (2*k0))
-
-    # --- 4) Build scattering PSF on CPU, then transfer ---
-    r_e   = 2.8179403227e-15
-    theta = np.linspace(0, 5e-3, 501)
-    cos_t = np.cos(theta)
-    dcs_r = r_e**2 * (1 + cos_t**2) / 2
-    alpha = energy*1e3/511e3
-    num   = 1 + cos_t**2
-    den   = (1 + alpha*(1 - cos_t))**2
-    dcs_c = (r_e**2/2) * num/den * (1 + alpha*(1 - cos_t)
-            - alpha**2*(1 - cos_t)**2/(num*(1 + alpha*(1 - cos_t))))
-    psf_r = (dcs_r + dcs_c) * 2 * np.pi * np.sin(theta)
-    psf_r /= np.trapz(psf_r, theta)
-
-    r_px = theta * config["DETECTOR_DIST"] / detector_pixel_size
-    yy, xx = np.mgrid[-ny_p//2:ny_p//2, -nx_p//2:nx_p//2]
-    rgrid = np.hypot(xx, yy)
-    psf2d = interp1d(r_px, psf_r, bounds_error=False, fill_value=0)(rgrid)
-    psf2d /= psf2d.sum()
-    psf2d_gpu = cp.asarray(psf2d, dtype=cp.float32)
-
-    # --- 5) Initialize wavefront on GPU ---
-    Psi = cp.ones((ny_p, nx_p), dtype=cp.complex64)
+    dz = voxel_size[0] * 1e-6
+
+    # --- 2) Propagation kernels and scattering PSF (precomputed per geometry) ---
+    if plan is None:
+        plan = get_propagator_plan((ny_p, nx_p), voxel_size, config)
+    k0 = plan.k0
+
+    if use_projection_approximation(plan, nz, config):
+        names = _integral_names(config)
+        integrals = [_line_integrals(volume, table, dz, names) for volume in volumes]
+        if stats is not None:
+            stats['fft_pairs'] = stats.get('fft_pairs', 0) + n_batch
+            stats['skipped_fft_pairs'] = stats.get('skipped_fft_pairs', 0) + nz * n_batch
+        return projection_from_line_integrals(integrals, config, plan, rngs=rngs)
+
+    # --- 3) Per-label slice transmission and scatter tables on the device ---
+    # Tables cover the whole uint16 range (vacuum past the last label), so
+    # compact label slices index them directly; each slice costs one transfer
+    # of its labels and one gather per table, and no property maps.
+    n_entries = max(len(table), 2**16)
+
+    def device_table(column, vacuum):
+        full = np.full(n_entries, vacuum, dtype=column.dtype)
+        full[:len(column)] = column
+        return backend.asarray(full)
+
+    T_host = T = None
+    if config["ENABLE_PHASE"] or config["ENABLE_ABSORPTION"]:
+        T_host = table.transmission(k0, dz, phase=config["ENABLE_PHASE"], absorption=config["ENABLE_ABSORPTION"])
+        T = device_table(T_host, 1)
+    if config["ENABLE_SCATTER"]:
+        p_scat_host, amplitude = table.scatter_tables(dz)
+        p_scat, amplitude = device_table(p_scat_host, 0), device_table(amplitude, 1)
+
+    def slice_labels(z):
+        labels_z = np.stack([np.asarray(volume[z]) for volume in volumes])
+        if labels_z.dtype not in (np.uint8, np.uint16):
+            # wide or float32 (> 65535 labels) buffers: out-of-table labels -> vacuum entry
+            labels_z = np.clip(labels_z.astype(np.intp), 0, len(table) - 1)
+        return labels_z
+
+    def padded(labels_z):
+        return xp.pad(backend.asarray(labels_z), ((0, 0), (pad, pad), (pad, pad)), mode='edge')
+
+    # Slices holding a single label that does not scatter (vacuum margins,
+    # homogeneous layers) only multiply the wave by a constant, which commutes
+    # with free-space propagation: runs of them are merged into one
+    # propagation over n·dz. This is exact (up to FFT rounding).
+    skip_uniform = config.get("SKIP_UNIFORM_SLICES", True)
+
+    def uniform_factor(labels_z):
+        """(B,) transmissions if every slice of the batch is one non-scattering label, else None."""
+        flat = labels_z.reshape(n_batch, -1)
+        first = flat[:, 0]
+        if not (flat == first[:, None]).all():
+            return None
+        index = np.minimum(first.astype(np.intp), len(table) - 1)
+        if config["ENABLE_SCATTER"] and p_scat_host[index].any():
+            return None
+        return T_host[index] if T_host is not None else np.ones(n_batch, dtype=np.complex128)
+
+    # --- 4) Initialize wavefronts on the device ---
+    Psi = xp.ones((n_batch, ny_p, nx_p), dtype=xp.complex64)
     
     # Optional: Add very small random phase for numerical stability only
+    plane_wave = skip_uniform  # the field is still uniform: propagation leaves it unchanged
     if config.get("ADD_RANDOM_PHASE", False):
-        rand_phase = cp.random.uniform(0, 2*cp.pi, (ny_p, nx_p), dtype=cp.float32)
-        Psi *= cp.exp(1j * rand_phase * 1e-6)  # Much smaller random phase
+        plane_wave = False
+        for b, rng in enumerate(rngs):
+            rand_phase = _random(rng, backend).uniform(0, 2*np.pi, (ny_p, nx_p)).astype(xp.float32)
+            Psi[b] *= xp.exp(1j * rand_phase * 1e-6)  # Much smaller random phase
 
-    # --- 6) Propagate slice-by-slice ---
-    for z in range(nz):
-        # free-space to next slice
-        Psi = cp.fft.ifft2(cp.fft.fft2(Psi) * H_slice)
+    # --- 5) Propagate slice-by-slice ---
+    # Scattered intensity is removed from the coherent wave at every slice and
+    # blurred with the PSF once per SCATTER_ACCUMULATE_SLICES slices (1 = every slice).
+    accumulate = max(1, int(config.get("SCATTER_ACCUMULATE_SLICES", 1)))
+    I_acc = None
+    pending = 0                                      # slice propagations not yet applied
+    factor = np.ones(n_batch, dtype=np.complex128)   # uniform-slice transmissions not yet applied
+    fft_pairs = 0
+
+    def advance(Psi, H_extra=None):
+        """Apply the pending propagations (then H_extra) with one FFT pair, and the pending factor."""
+        nonlocal pending, fft_pairs
+        if pending or H_extra is not None:
+            if plane_wave:
+                Psi = Psi * backend.asarray(factor.reshape(-1, 1, 1))
+            else:
+                H = plan.free_space(pending) if pending else None
+                H = H_extra if H is None else (H if H_extra is None else H * H_extra)
+                Psi = backend.ifft2(backend.fft2(Psi) * H)
+                fft_pairs += 1
+                if (factor != 1).any():
+                    Psi *= backend.asarray(factor.reshape(-1, 1, 1))
+            pending = 0
+            factor[:] = 1
+        return Psi
+
+    # Slabs: up to max_span consecutive slices share one propagation and a
+    # transmission that is the product of theirs (MULTISLICE_TOLERANCE bounds
+    # λ·Δz/dx² of a slab; 0 = one slab per slice, the exact multislice)
+    max_span = plan.max_slab_slices(config.get("MULTISLICE_TOLERANCE", 0))
+    slab = None
+    blur_due = False
 
-        if config["ENABLE_PHASE"]:
-            Psi *= cp.exp(1j * k0 * delta_p[z] * dz)
-        if config["ENABLE_ABSORPTION"]:
-            Psi *= cp.exp(-0.5 * mu_abs_p[z] * dz)
+    def add_to_slab(labels_z):
+        nonlocal slab
+        if slab is None:
+            slab = {'start': z,
+                    'T': T[labels_z] if T is not None else None,
+                    'p': p_scat[labels_z] if config["ENABLE_SCATTER"] else None,
+                    'amplitude': amplitude[labels_z] if config["ENABLE_SCATTER"] else None}
+            return
+        if T is not None:
+            slab['T'] *= T[labels_z]
         if config["ENABLE_SCATTER"]:
-            I    = cp.abs(Psi)**2
-            p    = 1 - cp.exp(-mu_scat_p[z] * dz)
-            I_sc = p * I
-            I_un = (1 - p) * I
-            # FFT-based convolution on GPU
-            I_bl = cpxsignal.fftconvolve(I_sc, psf2d_gpu, mode='same')
-            Psi  = cp.sqrt(cp.maximum(I_un + I_bl, 0)) * cp.exp(1j*cp.angle(Psi))
+            slab['amplitude'] *= amplitude[labels_z]
+            slab['p'] = None  # 1 - amplitude² of the whole slab
+
+    def close_slab(Psi):
+        nonlocal slab, I_acc, plane_wave
+        # free-space to the end of the slab, then its transmission
+        Psi = advance(Psi)
+        plane_wave = False
+        if slab['T'] is not None:
+            Psi *= slab['T']
+        if config["ENABLE_SCATTER"]:
+            p = slab['p'] if slab['p'] is not None else 1 - slab['amplitude']**2
+            I_sc = p * xp.abs(Psi)**2
+            I_acc = I_sc if I_acc is None else I_acc + I_sc
+            Psi *= slab['amplitude']
+        slab = None
+        return Psi
+
+    for z in range(nz):
+        labels_z = slice_labels(z)
+        pending += 1
+
+        constant = uniform_factor(labels_z) if skip_uniform else None
+        if constant is not None:
+            factor *= constant
+        else:
+            add_to_slab(padded(labels_z))
+
+        if slab is not None and (z - slab['start'] + 1 >= max_span or z == nz - 1):
+            Psi = close_slab(Psi)
+
+        # A blur due inside an open slab waits for the end of the slab
+        blur_due = blur_due or (z + 1) % accumulate == 0 or z == nz - 1
+        if blur_due and slab is None:
+            if I_acc is not None:
+                # FFT-based convolution with the precomputed PSF spectrum
+                Psi = advance(Psi)
+                I_bl = plan.scatter_blur(I_acc)
+                I_acc = None
+                Psi  = xp.sqrt(xp.maximum(xp.abs(Psi)**2 + I_bl, 0)) * xp.exp(1j*xp.angle(Psi))
+            blur_due = False
+
+    # --- 6) Final propagation to detector (merged with trailing uniform slices) ---
+    Psi   = advance(Psi, plan.H_det)
+    I_sim = xp.abs(Psi)**2
+    if stats is not None:
+        stats['fft_pairs'] = stats.get('fft_pairs', 0) + fft_pairs * n_batch
+        stats['skipped_fft_pairs'] = stats.get('skipped_fft_pairs', 0) + (nz + 1 - fft_pairs) * n_batch
+    
+    # --- 7) Convert to photon counts and add noise, crop back to the detector on the CPU ---
+    return _detector_images(I_sim, config, rngs, backend, pad, ny, nx)
+
+def use_projection_approximation(plan, nz, config):
+    """
+    Whether a sample of nz slices is propagated in the projection approximation.
+    
+    config["PROPAGATION"] selects "multislice", "projection" or "auto"
+    (default). In auto mode the approximation is used when λ·T/dx² of the
+    whole sample thickness T (PropagatorPlan.fresnel_error) is at most
+    config["PROJECTION_TOLERANCE"] (default 1e-3): diffraction inside the
+    sample is then negligible next to the propagation to the detector.
+    
+    Args:
+        plan: PropagatorPlan of the geometry
+        nz: number of slices along the beam
+        config: simulation config
+    
+    Returns:
+        bool
+    """
+    mode = config.get("PROPAGATION", "auto")
+    if mode not in ("auto", "multislice", "projection"):
+        raise ValueError(f"Unknown PROPAGATION '{mode}' (expected 'auto', 'multislice' or 'projection')")
+    if mode != "auto":
+        return mode == "projection"
+    return plan.fresnel_error(nz) <= config.get("PROJECTION_TOLERANCE", 1e-3)
+
+def projection_from_line_integrals(integrals, config, plan, rngs=None):
+    """
+    Detector intensities in the projection approximation, from line integrals.
+    
+    The exit wave is exp(i k0 ∫δ dz - ∫μ_abs dz / 2). Scattering removes
+    1 - exp(-∫μ_scat dz) of the intensity from the coherent wave and adds it
+    back blurred with the PSF, as for one slab; the wave is then propagated
+    to the detector with H_det (one FFT pair).
+    
+    Args:
+        integrals: sequence of B dicts name -> (ny, nx) ∫ property dz, as
+                   returned by PathLengthCache.line_integrals ('delta',
+                   'mu_abs', 'mu_scat' as enabled by ENABLE_PHASE /
+                   ENABLE_ABSORPTION / ENABLE_SCATTER)
+        config: simulation config
+        plan: PropagatorPlan of the padded (ny + 2 PAD, nx + 2 PAD) geometry
+        rngs: optional sequence of B RandomStates (see projection_batch)
+    
+    Returns:
+        I_sim : (B, ny, nx) simulated detector intensities (NumPy array)
+    """
+    backend = plan.backend
+    xp = backend.xp
+    pad = config["PAD"]
+    n_batch = len(integrals)
+    rngs = list(rngs) if rngs is not None else [None] * n_batch
+    ny, nx = plan.shape[0] - 2*pad, plan.shape[1] - 2*pad
+
+    def padded(name):
+        stack = np.stack([sums[name] for sums in integrals])
+        return backend.asarray(np.pad(stack, ((0, 0), (pad, pad), (pad, pad)), mode='edge'))
+
+    exponent = xp.zeros((n_batch,) + plan.shape, dtype=xp.complex128)
+    if config["ENABLE_PHASE"]:
+        exponent += 1j * plan.k0 * padded('delta')
+    if config["ENABLE_ABSORPTION"]:
+        exponent -= 0.5 * padded('mu_abs')
+    Psi = xp.exp(exponent).astype(xp.complex64)
 
-    # --- 7) Final propagation to detector ---
-    Psi   = cp.fft.ifft2(cp.fft.fft2(Psi) * H_det)
-    I_sim = cp.abs(Psi)**2
+    if config.get("ADD_RANDOM_PHASE", False):
+        for b, rng in enumerate(rngs):
+            rand_phase = _random(rng, backend).uniform(0, 2*np.pi, plan.shape).astype(xp.float32)
+            Psi[b] *= xp.exp(1j * rand_phase * 1e-6)
+
+    if config["ENABLE_SCATTER"]:
+        mu_s = padded('mu_scat')
+        I_sc = -xp.expm1(-mu_s) * xp.abs(Psi)**2
+        Psi *= xp.exp(-0.5 * mu_s)
+        I_bl = plan.scatter_blur(I_sc)
+        Psi = xp.sqrt(xp.maximum(xp.abs(Psi)**2 + I_bl, 0)) * xp.exp(1j*xp.angle(Psi))
+
+    Psi = backend.ifft2(backend.fft2(Psi) * plan.H_det)
+    return _detector_images(xp.abs(Psi)**2, config, rngs, backend, pad, ny, nx)
+
+def _integral_names(config):
+    """PropertyTable columns the projection approximation needs under config."""
+    names = []
+    if config["ENABLE_PHASE"]:
+        names.append('delta')
+    if config["ENABLE_ABSORPTION"]:
+        names.append('mu_abs')
+    if config["ENABLE_SCATTER"]:
+        names.append('mu_scat')
+    return names
+
+def _detector_images(I_sim, config, rngs, backend, pad, ny, nx):
+    """Photon statistics of (B, ny_p, nx_p) intensities, cropped to the detector, as one NumPy array."""
+    return np.stack([
+        backend.asnumpy(apply_photon_statistics(I_sim[b], config, rng=rng)[pad:pad+ny, pad:pad+nx])
+        for b, rng in enumerate(rngs)
+    ])
+
+def _line_integrals(volume_labels, table, dz, names, slab_size=32):
+    """
+    Line integrals of PropertyTable columns along the beam (z).
     
-    # --- 8) Convert to photon counts and add noise ---
-    I_sim = apply_photon_statistics(I_sim, config)
+    One nearest-neighbour sample per z-plane, gathered and summed one z-slab
+    at a time; given a geometry.RotatedVolumeView the rays follow the rotated
+    geometry without the rotated volume ever being stored.
+    
+    Returns:
+        dict name -> (ny, nx) float64 array of ∫ property dz (property units × m)
+    """
+    nz, ny, nx = volume_labels.shape
+    sums = {name: np.zeros((ny, nx), dtype=np.float64) for name in names}
+    for z0 in range(0, nz, slab_size):
+        slab = volume_labels[z0:min(z0 + slab_size, nz)]
+        for name in names:
+            sums[name] += table.gather(slab, name).sum(axis=0, dtype=np.float64)
+    return {name: total * dz for name, total in sums.items()}
+
+class _HostRandom:
+    """Draws of a NumPy RandomState returned as arrays of the backend."""
+
+    def __init__(self, rng, backend):
+        self.rng = rng
+        self.backend = backend
+
+    def uniform(self, low, high, size):
+        return self.backend.asarray(self.rng.uniform(low, high, size))
 
-    # return cropped detector image back on CPU
-    return cp.asnumpy(I_sim[pad:pad+ny, pad:pad+nx])
+    def poisson(self, lam, size=None):
+        return self.backend.asarray(self.rng.poisson(self.backend.asnumpy(lam), size=size))
 
-def apply_photon_statistics(intensity, config):
+    def normal(self, loc, scale, size):
+        return self.backend.asarray(self.rng.normal(loc, scale, size))
+
+def _random(rng, backend):
+    """Random source of a projection: the host RandomState `rng`, or the backend's global one if None."""
+    return backend.xp.random if rng is None else _HostRandom(rng, backend)
+
+def apply_photon_statistics(intensity, config, rng=None):
     """
     Convert normalized intensity to photon counts and add quantum noise.
     
     Args:
-        intensity: (ny, nx) normalized intensity (0-1 scale from wave simulation)
+        intensity: (ny, nx) normalized intensity (0-1 scale from wave simulation),
+                   on the device of the configured backend
         config: dict with photon parameters
+        rng: optional numpy.random.RandomState (draws are made on the host);
+             the global random state of the backend if omitted
     
     Returns:
         photon_counts: (ny, nx) array with photon statistics applied
     """
+    backend = get_backend(config)
+    xp = backend.xp
+    random = _random(rng, backend)
+
     # Get photon parameters from config
     incident_photons = config.get("INCIDENT_PHOTONS", 1e6)  # Photons per pixel
     detector_efficiency = config.get("DETECTOR_EFFICIENCY", 0.8)  # Quantum efficiency
@@ -152,142 +408,191 @@ def apply_photon_statistics(intensity, config):
     # Add Poisson noise (photon shot noise)
     if config.get("ENABLE_PHOTON_NOISE", True):
         # Use Poisson statistics for photon counting
-        detected_photons = cp.random.poisson(detected_photons).astype(cp.float32)
+        detected_photons = random.poisson(detected_photons).astype(xp.float32)
     
     # Add dark current (also Poisson distributed)
     if dark_current > 0:
-        dark_counts = cp.random.poisson(dark_current, size=detected_photons.shape).astype(cp.float32)
+        dark_counts = random.poisson(dark_current, size=detected_photons.shape).astype(xp.float32)
         detected_photons += dark_counts
     
     # Add readout noise (Gaussian)
     if readout_noise > 0:
-        readout_counts = cp.random.normal(0, readout_noise, size=detected_photons.shape).astype(cp.float32)
+        readout_counts = random.normal(0, readout_noise, size=detected_photons.shape).astype(xp.float32)
         detected_photons += readout_counts
     
     # Ensure non-negative counts
-    detected_photons = cp.maximum(detected_photons, 0)
+    detected_photons = xp.maximum(detected_photons, 0)
     
     return detected_photons
 
-def calculate_dose_map_accurate(volume_labels, lookup, incident_photons, energy_kev, voxel_size):
+def calculate_dose_map_accurate(volume_labels, lookup, incident_photons, energy_kev, voxel_size, slab_size=32, config=None):
     """
     Calculate absorbed dose map accounting for beam attenuation.
     
+    The beam travels along z; the fluence reaching voxel z is
+    I0 * exp(-cumsum(mu_total * dz)) over the voxels in front of it. The
+    volume is processed in z-slabs of `slab_size` slices so temporaries stay
+    bounded, carrying the optical depth from one slab to the next.
+    
     Args:
-        volume_labels: (nz, ny, nx) integer labels
+        volume_labels: (nz, ny, nx) integer labels (array or io.LazyVolume)
         lookup: dict mapping label to {composition, density}
         incident_photons: Number of incident photons per pixel
         energy_kev: X-ray energy in keV
         voxel_size: (dz, dy, dx) in microns
+        slab_size: number of z-slices processed at once
+        config: optional simulation config (MATERIAL_CACHE, SKIP_INVALID_MATERIALS)
     
     Returns:
         dose_map: (nz, ny, nx) absorbed dose in Gray per voxel
     """
-    import xraylib
-    xraylib.XRayInit()
-    
     nz, ny, nx = volume_labels.shape
+    slab_size = getattr(volume_labels, 'slab_size', slab_size)  # chunk-aligned for lazy volumes
     dose_map = np.zeros((nz, ny, nx), dtype='float32')
+    beam_0 = incident_fluence(incident_photons, energy_kev)
+    table = property_table(lookup, config, energy_kev)
+    
+    # Optical depth accumulated in front of the current slab, per (y, x) column
+    depth = np.zeros((ny, nx), dtype=np.float64)
+    
+    for z0 in range(0, nz, slab_size):
+        z1 = min(z0 + slab_size, nz)
+        mu_total, factor = _dose_factors(volume_labels[z0:z1], table, voxel_size)
+        
+        # Beam intensity reaching each voxel (attenuated by the voxels before it)
+        depth_before = _depth_before(mu_total, depth, voxel_size)
+        dose_map[z0:z1] = beam_0 * np.exp(-depth_before) * factor
     
-    # Physical constants
-    photon_energy_J = energy_kev * 1e3 * 1.602176634e-19
+    return dose_map
+
+def incident_fluence(incident_photons, energy_kev):
+    """Energy fluence entering the volume (J/cm²)."""
+    return incident_photons * energy_kev * 1e3 * 1.602176634e-19
+
+def _dose_factors(labels, table, voxel_size):
+    """
+    Total attenuation (1/cm) and dose per unit fluence (Gy per J/cm²) of a label slab.
+    
+    The dose per fluence is μ_en·dz / (ρ·V), and 0 in voxels that do not
+    attenuate or have no mass (vacuum).
+    """
     voxel_thickness_cm = voxel_size[0] * 1e-4  # Convert µm to cm
     voxel_volume_cm3 = np.prod(voxel_size) * 1e-12  # Convert µm³ to cm³
+    mu_total = table.gather(labels, 'mu_total')  # Total attenuation (cm⁻¹)
+    mu_en = table.gather(labels, 'mu_en')        # Energy absorption (cm⁻¹)
+    mass_per_voxel = table.gather(labels, 'density') * voxel_volume_cm3  # g
     
-    # Create material property maps
-    mu_total_map = np.zeros((nz, ny, nx), dtype='float32')  # Total attenuation
-    mu_en_map = np.zeros((nz, ny, nx), dtype='float32')     # Energy absorption
-    density_map = np.zeros((nz, ny, nx), dtype='float32')   # Density
+    # Energy absorbed per voxel (J for 1 cm² beam area) over voxel mass (kg) = Gy
+    valid = (mu_total > 0) & (mass_per_voxel > 0)
+    factor = np.zeros(labels.shape, dtype='float32')
+    factor[valid] = mu_en[valid] * voxel_thickness_cm / (mass_per_voxel[valid] * 1e-3)
+    return mu_total, factor
+
+def _depth_before(mu_total, depth, voxel_size):
+    """Optical depth in front of each voxel of a slab; `depth` (in front of the slab) is advanced past it."""
+    mu_dz = mu_total * (voxel_size[0] * 1e-4)
+    slab_depth = np.cumsum(mu_dz, axis=0, dtype=np.float64)
+    depth_before = slab_depth - mu_dz + depth
+    depth += slab_depth[-1]
+    return depth_before
+
+def optical_depth_map(volume_labels, lookup, energy_kev, voxel_size, slab_size=32, config=None):
+    """
+    Optical depth ∫μ_total dz in front of each voxel along the beam (z).
     
-    for label_id, props in lookup.items():
-        mask = (volume_labels == int(label_id))
-        if not np.any(mask):
-            continue
-        
-        composition = props.get('composition', {})
-        density = props.get('density', 0.0)
-        
-        if not composition or density == 0.0:
-            continue
-        
-        formula = ''.join(f"{el}{amt}" for el, amt in composition.items())
-        
-        try:
-            # Mass attenuation coefficients
-            mu_total = xraylib.CS_Total_CP(formula, energy_kev)  # cm²/g
-            mu_en = xraylib.CS_Energy_CP(formula, energy_kev)    # cm²/g
-            
-            # Linear attenuation coefficients
-            mu_total_map[mask] = mu_total * density  # cm⁻¹
-            mu_en_map[mask] = mu_en * density        # cm⁻¹
-            density_map[mask] = density              # g/cm³
-            
-        except Exception as e:
-            print(f"Warning: Could not calculate properties for {label_id} ({formula}): {e}")
-            continue
-    
-    # Calculate dose accounting for beam attenuation
-    for y in range(ny):
-        for x in range(nx):
-            # Initial beam intensity
-            beam_intensity = incident_photons * photon_energy_J  # J/cm²
-            
-            # Propagate beam through volume slice by slice
-            for z in range(nz):
-                if mu_total_map[z, y, x] > 0:
-                    # Energy absorbed in this voxel
-                    energy_absorbed_per_cm2 = beam_intensity * mu_en_map[z, y, x] * voxel_thickness_cm
-                    
-                    # Convert to energy per voxel volume
-                    energy_absorbed_per_voxel = energy_absorbed_per_cm2  # J (for 1 cm² beam area)
-                    
-                    # Mass of material in this voxel
-                    mass_per_voxel = density_map[z, y, x] * voxel_volume_cm3  # g
-                    
-                    if mass_per_voxel > 0:
-                        # Dose = Energy / Mass
-                        dose_gray = energy_absorbed_per_voxel / (mass_per_voxel * 1e-3)  # J/kg = Gy
-                        dose_map[z, y, x] = dose_gray
-                    
-                    # Attenuate beam for next slice
-                    attenuation = np.exp(-mu_total_map[z, y, x] * voxel_thickness_cm)
-                    beam_intensity *= attenuation
+    The fluence reaching a voxel is incident_fluence() · exp(-depth). Unlike
+    a dose map the field is smooth across material boundaries, so it can be
+    resampled (e.g. rotated into another frame) with nearest neighbours.
     
-    return dose_map
+    Returns:
+        (nz, ny, nx) float32 optical depth
+    """
+    nz, ny, nx = volume_labels.shape
+    slab_size = getattr(volume_labels, 'slab_size', slab_size)
+    table = property_table(lookup, config, energy_kev)
+    depth_map = np.zeros((nz, ny, nx), dtype='float32')
+    depth = np.zeros((ny, nx), dtype=np.float64)
+    for z0 in range(0, nz, slab_size):
+        z1 = min(z0 + slab_size, nz)
+        depth_map[z0:z1] = _depth_before(table.gather(volume_labels[z0:z1], 'mu_total'), depth, voxel_size)
+    return depth_map
+
+def dose_factor_map(volume_labels, lookup, energy_kev, voxel_size, slab_size=32, config=None):
+    """
+    Dose per unit fluence (Gy per J/cm²) of each voxel, 0 in vacuum.
+    
+    Returns:
+        (nz, ny, nx) float32 map
+    """
+    nz, ny, nx = volume_labels.shape
+    slab_size = getattr(volume_labels, 'slab_size', slab_size)
+    table = property_table(lookup, config, energy_kev)
+    factor_map = np.zeros((nz, ny, nx), dtype='float32')
+    for z0 in range(0, nz, slab_size):
+        z1 = min(z0 + slab_size, nz)
+        factor_map[z0:z1] = _dose_factors(volume_labels[z0:z1], table, voxel_size)[1]
+    return factor_map
 
 # Use accurate dose calculation
 calculate_dose_map = calculate_dose_map_accurate
 
-def calculate_total_dose_statistics(dose_map, volume_labels, lookup):
+def calculate_total_dose_statistics(dose_map, volume_labels, lookup, slab_size=32):
     """
     Calculate dose statistics for different materials in the phantom.
     
+    Streams over z-slabs, so volume_labels may be a lazily read volume
+    (io.LazyVolume; its own slab size is used then).
+    
     Args:
         dose_map: (nz, ny, nx) dose in Gray per voxel
         volume_labels: (nz, ny, nx) material labels
         lookup: material properties dict
+        slab_size: number of z-slices processed at once
     
     Returns:
         dose_stats: dict with dose statistics per material
     """
-    dose_stats = {}
+    slab_size = getattr(volume_labels, 'slab_size', slab_size)
+    labels_by_id = {int(label_id): label_id for label_id in lookup}
     
-    for label_id, props in lookup.items():
-        mask = (volume_labels == int(label_id))
-        if not np.any(mask):
-            continue
-        
-        material_doses = dose_map[mask]
-        material_doses = material_doses[material_doses > 0]  # Exclude zero doses
-        
-        if len(material_doses) > 0:
+    # Running per-label sums over the slabs (positive doses only, like the mean/min/max)
+    count = dict.fromkeys(labels_by_id, 0)
+    n_dosed = dict.fromkeys(labels_by_id, 0)
+    dose_sum = dict.fromkeys(labels_by_id, 0.0)
+    dose_max = dict.fromkeys(labels_by_id, -np.inf)
+    dose_min = dict.fromkeys(labels_by_id, np.inf)
+    
+    nz = volume_labels.shape[0]
+    for z0 in range(0, nz, slab_size):
+        z1 = min(z0 + slab_size, nz)
+        labels = np.asarray(volume_labels[z0:z1])
+        dose = np.asarray(dose_map[z0:z1])
+        for label in labels_by_id:
+            mask = (labels == label)
+            n_voxels = int(np.count_nonzero(mask))
+            if n_voxels == 0:
+                continue
+            count[label] += n_voxels
+            
+            material_doses = dose[mask]
+            material_doses = material_doses[material_doses > 0]  # Exclude zero doses
+            if len(material_doses) > 0:
+                n_dosed[label] += len(material_doses)
+                dose_sum[label] += float(np.sum(material_doses, dtype=np.float64))
+                dose_max[label] = max(dose_max[label], float(np.max(material_doses)))
+                dose_min[label] = min(dose_min[label], float(np.min(material_doses)))
+    
+    dose_stats = {}
+    for label, label_id in labels_by_id.items():
+        if n_dosed[label] > 0:
+            props = lookup[label_id]
             dose_stats[label_id] = {
-                'material_name': ''.join(f"{el}{amt}" for el, amt in props.get('composition', {}).items()),
-                'mean_dose_gy': float(np.mean(material_doses)),
-                'max_dose_gy': float(np.max(material_doses)),
-                'min_dose_gy': float(np.min(material_doses)),
-                'total_volume_um3': float(np.sum(mask) * np.prod([0.5, 0.5, 0.5])),  # Assuming voxel size
-                'voxel_count': int(np.sum(mask))
+                'material_name': material_formula(props.get('composition', {})),
+                'mean_dose_gy': dose_sum[label] / n_dosed[label],
+                'max_dose_gy': dose_max[label],
+                'min_dose_gy': dose_min[label],
+                'total_volume_um3': float(count[label] * np.prod([0.5, 0.5, 0.5])),  # Assuming voxel size
+                'voxel_count': count[label]
             }
     
     return dose_stats
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""
+Precomputed Fresnel propagation kernels and scattering PSF.
+
+Everything in a `PropagatorPlan` depends only on energy, padded field shape,
+slice thickness, detector pixel size and detector distance, so it is built
+once per projection series and reused for every angle (and for later series
+with the same geometry).
+"""
+
+from collections import OrderedDict
+import numpy as np
+from scipy.interpolate import interp1d
+from scipy.fft import next_fast_len
+from msim.backend import get_backend
+
+# np.trapz was renamed to np.trapezoid in NumPy 2.0
+_trapezoid = getattr(np, "trapezoid", None) or np.trapz
+
+
+def scatter_psf(energy_kev, shape, detector_dist, detector_pixel_size):
+    """
+    Rayleigh + Compton (Thomson / Klein-Nishina) angular PSF on the detector grid.
+
+    Args:
+        energy_kev: X-ray energy in keV
+        shape: (ny, nx) padded field shape
+        detector_dist: sample-to-detector distance (m)
+        detector_pixel_size: detector pixel size (m)
+
+    Returns:
+        psf2d: (ny, nx) float64 PSF centred at (ny//2, nx//2), normalised to unit sum
+    """
+    ny_p, nx_p = shape
+    r_e   = 2.8179403227e-15
+    theta = np.linspace(0, 5e-3, 501)
+    cos_t = np.cos(theta)
+    dcs_r = r_e**2 * (1 + cos_t**2) / 2
+    alpha = energy_kev*1e3/511e3
+    num   = 1 + cos_t**2
+    den   = (1 + alpha*(1 - cos_t))**2
+    dcs_c = (r_e**2/2) * num/den * (1 + alpha*(1 - cos_t)
+            - alpha**2*(1 - cos_t)**2/(num*(1 + alpha*(1 - cos_t))))
+    psf_r = (dcs_r + dcs_c) * 2 * np.pi * np.sin(theta)
+    psf_r /= _trapezoid(psf_r, theta)
+
+    r_px = theta * detector_dist / detector_pixel_size
+    yy, xx = np.mgrid[-ny_p//2:ny_p//2, -nx_p//2:nx_p//2]
+    rgrid = np.hypot(xx, yy)
+    psf2d = interp1d(r_px, psf_r, bounds_error=False, fill_value=0)(rgrid)
+    psf2d /= psf2d.sum()
+    return psf2d
+
+
+# Number of multi-slice free-space propagators kept per plan
+_MAX_FREE_SPACE = 8
+
+
+class PropagatorPlan:
+    """
+    Device-resident kernels for one propagation geometry.
+
+    Attributes:
+        k0       : vacuum wavenumber (1/m)
+        dz       : slice thickness (m)
+        pixel_size : sampling of the propagation grid (detector pixel size, m)
+        H_slice  : Fresnel propagator over one slice
+        H_det    : Fresnel propagator from exit plane to detector
+        free_space(n) : Fresnel propagator over n slices (n·dz)
+        psf2d    : scattering PSF (float32, on device)
+        psf_spec : real-FFT spectrum of psf2d at the linear-convolution size
+
+    scatter_blur() reuses a preallocated zero-padded real buffer, so each
+    blur costs one rfft2/irfft2 pair and no padding allocations. It also
+    blurs a (B, ny, nx) stack of intensities in one batched FFT pair.
+    """
+
+    def __init__(self, shape, energy_kev, dz, detector_pixel_size, detector_dist, backend):
+        self.shape = tuple(shape)
+        self.backend = backend
+        xp = backend.xp
+        ny_p, nx_p = self.shape
+
+        # wavenumber
+        self.k0 = 2 * np.pi / ((6.62607015e-34 * 2.99792458e8) / (energy_kev*1e3*1.602176634e-19))
+        self.dz = dz
+        self.pixel_size = detector_pixel_size
+        kx = xp.fft.fftfreq(nx_p, detector_pixel_size) * 2 * np.pi
+        ky = xp.fft.fftfreq(ny_p, detector_pixel_size) * 2 * np.pi
+        KX, KY = xp.meshgrid(kx, ky)
+        K2 = KX**2 + KY**2
+        self.H_slice = xp.exp(-1j * K2 * dz / (2*self.k0))
+        self.H_det   = xp.exp(-1j * K2 * detector_dist / (2*self.k0))
+        self._K2 = K2
+        self._free = OrderedDict()
+
+        # Scattering PSF and its spectrum, padded for a linear ('same') convolution
+        psf2d = scatter_psf(energy_kev, self.shape, detector_dist, detector_pixel_size)
+        self.psf2d = backend.asarray(psf2d, dtype=xp.float32)
+        self.conv_shape = tuple(next_fast_len(2*n - 1, True) for n in self.shape)
+        self.psf_spec = backend.rfft2(self.psf2d, s=self.conv_shape)
+        self._crop = tuple(slice((n - 1)//2, (n - 1)//2 + n) for n in self.shape)
+        self._conv_buf = None
+
+    def free_space(self, n_slices):
+        """Fresnel propagator over n_slices slices (H_slice for 1; the last few lengths are cached)."""
+        if n_slices == 1:
+            return self.H_slice
+        if n_slices in self._free:
+            self._free.move_to_end(n_slices)
+            return self._free[n_slices]
+        H = self.backend.xp.exp(-1j * self._K2 * (n_slices * self.dz) / (2*self.k0))
+        self._free[n_slices] = H
+        if len(self._free) > _MAX_FREE_SPACE:
+            self._free.popitem(last=False)
+        return H
+
+    def fresnel_error(self, n_slices):
+        """λ·Δz/dx² of a slab of n_slices slices: the multislice error scale of treating it as one slice."""
+        wavelength = 2 * np.pi / self.k0
+        return wavelength * n_slices * self.dz / self.pixel_size**2
+
+    def max_slab_slices(self, tolerance):
+        """Most slices one slab may span with fresnel_error(n) <= tolerance (at least 1; 1 if tolerance is 0)."""
+        if not tolerance:
+            return 1
+        return max(1, int(tolerance / self.fresnel_error(1)))
+
+    def scatter_blur(self, intensity):
+        """Convolve a (ny, nx) or (B, ny, nx) intensity with the PSF (same as fftconvolve mode='same')."""
+        xp = self.backend.xp
+        buf_shape = intensity.shape[:-2] + self.conv_shape
+        if self._conv_buf is None or self._conv_buf.dtype != intensity.dtype or self._conv_buf.shape != buf_shape:
+            # Only the top-left (ny, nx) block is ever written, the rest stays zero
+            self._conv_buf = xp.zeros(buf_shape, dtype=intensity.dtype)
+        ny, nx = self.shape
+        self._conv_buf[..., :ny, :nx] = intensity
+        spec = self.backend.rfft2(self._conv_buf)
+        spec *= self.psf_spec
+        full = self.backend.irfft2(spec, s=self.conv_shape)
+        return full[(Ellipsis,) + self._crop]
+
+
+_PLANS = OrderedDict()
+_MAX_PLANS = 4
+
+
+def get_propagator_plan(shape, voxel_size, config):
+    """
+    Return the PropagatorPlan for a padded field shape, reusing cached plans.
+
+    Args:
+        shape: (ny_p, nx_p) padded field shape
+        voxel_size: (dz, dy, dx) in microns
+        config: simulation config (ENERGY_KEV, DETECTOR_DIST, DETECTOR_PIXEL_SIZE, BACKEND)
+
+    Returns:
+        PropagatorPlan
+    """
+    backend = get_backend(config)
+    dz, dy, dx = [v * 1e-6 for v in voxel_size]
+    # Detector pixel size (user-defined, not voxel size!)
+    detector_pixel_size = config.get("DETECTOR_PIXEL_SIZE", dy)  # Default to voxel size if not specified
+    key = (id(backend), tuple(shape), float(config["ENERGY_KEV"]), dz,
+           float(detector_pixel_size), float(config["DETECTOR_DIST"]))
+
+    if key in _PLANS:
+        _PLANS.move_to_end(key)
+        return _PLANS[key]
+
+    plan = PropagatorPlan(shape, config["ENERGY_KEV"], dz, detector_pixel_size,
+                          config["DETECTOR_DIST"], backend)
+    _PLANS[key] = plan
+    if len(_PLANS) > _MAX_PLANS:
+        _PLANS.popitem(last=False)
+    return plan
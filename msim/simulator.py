@@ -1,9 +1,13 @@
 import numpy as np
+import os
 import json
 import h5py
-import z5py
-from msim.geometry import simulate_projection_series
+from contextlib import contextmanager
+from msim.geometry import simulate_projection_series, DoseAccumulator
 from msim.physics import calculate_dose_map, calculate_total_dose_statistics
+from msim.labels import compact_labels, compact_label_plan, label_ids, remap_lookup
+from msim.io import open_label_dataset, read_metadata_json, read_attr, LazyVolume
+from msim.pathlength import PathLengthCache, render_projection_series
 
 class XRayScanner:
     """Simple interface for X-ray tomography and laminography with dose calculation."""
@@ -15,111 +19,299 @@ class XRayScanner:
         self.volume = None
         self.lookup = None
         self.voxel_size = None
+        self.label_remap = None
+        self.resolution_level = 0
+        self._source = None
+        self._levels = {}
     
-    def load_volume(self, volume_path, metadata_path, scale_key="0"):
-        """Load volume from your zarr/n5 files."""
-        # Load volume data
-        try:
-            f = z5py.File(volume_path, use_zarr_format=True)
-            self.volume = f[scale_key][...]
-        except:
-            f = z5py.File(volume_path, use_zarr_format=False) 
-            self.volume = f[scale_key]['labels'][...]
+    def load_volume(self, volume_path, metadata_path, scale_key="0", lazy=None, resolution_level=None):
+        """
+        Load volume from your zarr/n5/hdf5 files.
+        
+        Labels are kept in the smallest unsigned dtype that fits. Sparse IDs
+        are remapped to consecutive ones, and the lookup is re-keyed to match
+        (self.label_remap holds {original: loaded} in that case).
+        
+        With lazy=True (default: config["LAZY_VOLUME"], False) the volume is
+        not read into memory: self.volume is an io.LazyVolume that reads
+        chunk-aligned z-slabs on demand, so dose maps and dose statistics
+        stream through it. Projection series still read the whole volume, once
+        per series.
+        
+        resolution_level=L loads pyramid level L (scale_key "L") of a volume
+        written by save_multiscale_zarr; the voxel size is scaled by 2**L.
+        """
+        if lazy is None:
+            lazy = self.config.get("LAZY_VOLUME", False)
+        if resolution_level is not None:
+            scale_key = str(resolution_level)
+        level = int(scale_key) if str(scale_key).isdigit() else 0
+        
+        # Open volume data (Zarr/HDF5: <scale_key>, N5: <scale_key>/labels)
+        vol_file, dataset = open_label_dataset(volume_path, scale_key)
         
         # Load metadata
-        with open(metadata_path, 'r') as f:
-            meta = json.load(f)
+        voxel_size, self.lookup = read_metadata_json(metadata_path)
+        
+        # Metadata voxel size is the one of level 0
+        self.voxel_size = [v * 2**level for v in voxel_size]
+        
+        # Volume saved with remapped IDs (io.save_multiscale_zarr): follow with the lookup
+        stored_remap = read_attr(vol_file, 'label_remap')
+        if stored_remap:
+            stored_remap = {int(k): int(v) for k, v in stored_remap.items()}
+            self.lookup = remap_lookup(self.lookup, stored_remap)
+        
+        if lazy:
+            chunks_3d = self.config.get("CHUNKS_3D")
+            self.volume = LazyVolume(dataset, slab_size=chunks_3d[0] if chunks_3d else None)
+            remap = None
+            if self.volume.dtype not in (np.uint8, np.uint16):
+                # One streaming pass to find the labels; conversion then happens per slab
+                dtype, label_remap = compact_label_plan(label_ids(self.volume), self.lookup)
+                self.volume = LazyVolume(dataset, slab_size=self.volume.slab_size,
+                                         convert=label_remap, dtype=dtype)
+                if label_remap is not None:
+                    remap = label_remap.as_dict()
+                    self.lookup = remap_lookup(self.lookup, remap)
+        else:
+            self.volume, self.lookup, remap = compact_labels(dataset[...], self.lookup)
+        if stored_remap and remap:
+            stored_remap = {k: remap[v] for k, v in stored_remap.items() if v in remap}
+        self.label_remap = stored_remap or remap
+        if remap:
+            print(f"Remapped {len(remap)} sparse label IDs")
         
-        self.voxel_size = meta.get("voxel_size", [1.0, 1.0, 1.0])
-        self.lookup = meta.get("lookup", meta)
+        self.resolution_level = level
+        self._source = (volume_path, metadata_path, lazy)
+        self._levels = {level: (self.volume, self.voxel_size, self.lookup, self.label_remap)}
         
-        print(f"Loaded volume: {self.volume.shape}")
-        print(f"Voxel size: {self.voxel_size} µm")
+        print(f"{'Opened lazy' if lazy else 'Loaded'} volume: {self.volume.shape}, labels as {self.volume.dtype}")
+        print(f"Voxel size: {self.voxel_size} µm (resolution level {level})")
         print(f"Materials: {len(self.lookup)} types")
     
-    def tomography_scan(self, angles_deg, output_file="tomography.h5", calculate_dose=False):
-        """Run tomography scan with optional dose calculation."""
+    def _level_config(self, level):
+        """Config for a scan at pyramid `level`: detector pixel and padding follow the voxel size."""
+        config = dict(self.config)
+        factor = 2**level
+        if "DETECTOR_PIXEL_SIZE" in config:
+            config["DETECTOR_PIXEL_SIZE"] = config["DETECTOR_PIXEL_SIZE"] * factor
+        if "PAD" in config:
+            config["PAD"] = int(round(config["PAD"] / factor))  # same physical padding
+        return config
+    
+    @contextmanager
+    def _at_resolution(self, level=None):
+        """
+        Run with the volume, voxel size and config of pyramid `level`.
+        
+        Levels other than the loaded one are read from the same file on first
+        use and kept for later scans; the loaded level is restored afterwards.
+        """
         if self.volume is None:
             raise ValueError("Load volume first")
+        level = self.resolution_level if level is None else int(level)
+        saved = (self.volume, self.voxel_size, self.lookup, self.label_remap,
+                 self.resolution_level, self._levels)
+        base_config = self.config
+        try:
+            if level not in self._levels:
+                volume_path, metadata_path, lazy = self._source
+                levels = self._levels
+                self.load_volume(volume_path, metadata_path, lazy=lazy, resolution_level=level)
+                levels[level] = self._levels[level]
+                self._levels = levels
+            self.volume, self.voxel_size, self.lookup, self.label_remap = self._levels[level]
+            self.resolution_level = level
+            self.config = self._level_config(level)
+            yield
+        finally:
+            (self.volume, self.voxel_size, self.lookup, self.label_remap,
+             self.resolution_level, self._levels) = saved
+            self.config = base_config
+    
+    def tomography_scan(self, angles_deg, output_file="tomography.h5", calculate_dose=False, return_projections=True, resolution_level=None):
+        """
+        Run tomography scan with optional dose calculation.
         
-        print(f"Running tomography: {len(angles_deg)} projections")
+        The dose is accumulated over every exposed angle in the sample frame
+        (see DoseAccumulator; DOSE_ANGLE_STRIDE subsamples angles).
+        Projections are streamed to `output_file` as they are produced; with
+        return_projections=False they are not read back into memory.
         
-        projections = simulate_projection_series(
-            self.volume, self.lookup, self.voxel_size,
-            angles_deg, tilt_deg=0, config=self.config
-        )
+        resolution_level=L runs the scan on pyramid level L (e.g. 2 for a
+        64x smaller preview) with voxel size, DETECTOR_PIXEL_SIZE and PAD
+        scaled accordingly; None uses the loaded level.
+        """
+        with self._at_resolution(resolution_level):
+            print(f"Running tomography: {len(angles_deg)} projections")
+            return self._run_scan(angles_deg, 0, output_file, calculate_dose, return_projections)
+    
+    def laminography_scan(self, angles_deg, tilt_deg, output_file="laminography.h5", calculate_dose=False, return_projections=True, resolution_level=None):
+        """
+        Run laminography scan with optional dose calculation.
         
-        dose_map = None
-        dose_stats = None
-        if calculate_dose:
-            print("Calculating dose distribution...")
-            dose_map = calculate_dose_map(
-                self.volume, self.lookup, 
-                self.config.get("INCIDENT_PHOTONS", 1e6),
-                self.config.get("ENERGY_KEV", 23.0),
-                self.voxel_size
+        The dose is accumulated over every exposed angle in the sample frame
+        (see DoseAccumulator; DOSE_ANGLE_STRIDE subsamples angles).
+        Projections are streamed to `output_file` as they are produced; with
+        return_projections=False they are not read back into memory.
+        
+        resolution_level=L runs the scan on pyramid level L (e.g. 2 for a
+        64x smaller preview) with voxel size, DETECTOR_PIXEL_SIZE and PAD
+        scaled accordingly; None uses the loaded level.
+        """
+        with self._at_resolution(resolution_level):
+            print(f"Running laminography: tilt={tilt_deg}°, {len(angles_deg)} projections")
+            return self._run_scan(angles_deg, tilt_deg, output_file, calculate_dose, return_projections)
+    
+    def _run_scan(self, angles_deg, tilt_deg, output_file, calculate_dose, return_projections):
+        """
+        Simulate a projection series straight into the output HDF5 file.
+        
+        With config["CHECKPOINT"] the completed angles are recorded in
+        exchange/completed; rerunning the same scan (same config, angles and
+        volume geometry) into the same file resumes where it stopped.
+        
+        With config["SAVE_PATH_LENGTHS"] the per-angle label path lengths are
+        stored in the path_lengths group for rerender().
+        """
+        dose_acc = DoseAccumulator(self.volume, self.lookup, self.voxel_size, self.config) if calculate_dose else None
+        checkpoint = self.config.get("CHECKPOINT", False)
+        
+        f = self._open_checkpoint(output_file, angles_deg, tilt_deg) if checkpoint else None
+        if f is None:
+            f = h5py.File(output_file, 'w')
+            self._create_output(f, angles_deg, tilt_deg)
+            if checkpoint:
+                f["exchange"].create_dataset("completed", shape=(len(angles_deg),), dtype=bool)
+                f.attrs['scan_fingerprint'] = self._scan_fingerprint(angles_deg, tilt_deg)
+        data = f["exchange/data"]
+        completed = f["exchange/completed"] if checkpoint else None
+        path_lengths = None
+        if self.config.get("SAVE_PATH_LENGTHS", False):
+            path_lengths = PathLengthCache(self.volume.shape, self.voxel_size, group=f.require_group("path_lengths"))
+        
+        with f:
+            simulate_projection_series(
+                self.volume, self.lookup, self.voxel_size,
+                angles_deg, tilt_deg=tilt_deg, config=self.config,
+                dose_accumulator=dose_acc, sink=data, completed=completed,
+                path_lengths=path_lengths
             )
-            dose_stats = calculate_total_dose_statistics(dose_map, self.volume, self.lookup)
-            self._print_dose_summary(dose_stats)
+            
+            dose_stats = None
+            if calculate_dose:
+                print("Accumulating dose over all angles...")
+                dose_map = dose_acc.dose_map(len(angles_deg))
+                dose_stats = self._original_labels(calculate_total_dose_statistics(dose_map, self.volume, self.lookup))
+                self._print_dose_summary(dose_stats)
+                self._save_dose(f, dose_map)
+            
+            projections = data[...] if return_projections else None
         
-        self._save_results(projections, angles_deg, output_file, tilt_deg=0, dose_map=dose_map)
         print(f"Saved to: {output_file}")
         return projections, dose_stats
     
-    def laminography_scan(self, angles_deg, tilt_deg, output_file="laminography.h5", calculate_dose=False):
-        """Run laminography scan with optional dose calculation."""
-        if self.volume is None:
-            raise ValueError("Load volume first")
+    # Config keys that only affect how a scan is executed, not its result
+    # (seeded noise is drawn from host NumPy whatever BACKEND and N_WORKERS
+    # are, see geometry.angle_rng; only FFT rounding differs between backends)
+    _EXECUTION_KEYS = ("CHECKPOINT", "BACKEND", "FFT_WORKERS", "N_WORKERS", "MATERIAL_CACHE", "PROJECTOR",
+                       "LAZY_VOLUME", "PROJECTION_BATCH", "SKIP_UNIFORM_SLICES", "SAVE_PATH_LENGTHS")
+    
+    def _scan_fingerprint(self, angles, tilt_deg):
+        """JSON string identifying a scan for checkpoint/resume."""
+        config = {k: v for k, v in self.config.items() if k not in self._EXECUTION_KEYS}
+        return json.dumps({
+            "config": config,
+            "angles": [float(a) for a in angles],
+            "tilt_deg": float(tilt_deg),
+            "volume_shape": [int(n) for n in self.volume.shape],
+            "voxel_size": [float(v) for v in self.voxel_size],
+            "lookup": self.lookup,
+        }, sort_keys=True)
+    
+    def _open_checkpoint(self, output_file, angles, tilt_deg):
+        """Reopen an interrupted scan for appending, or return None to start over."""
+        if not os.path.exists(output_file):
+            return None
+        try:
+            f = h5py.File(output_file, 'a')
+        except OSError as e:
+            print(f"Checkpoint {output_file} unreadable, starting over: {e}")
+            return None
+        if ("exchange/completed" in f and "exchange/data" in f
+                and f.attrs.get('scan_fingerprint') == self._scan_fingerprint(angles, tilt_deg)):
+            return f
+        f.close()
+        print(f"Checkpoint {output_file} belongs to a different scan, starting over")
+        return None
+    
+    def rerender(self, output_file, lookup=None, energy_kev=None, resolution_level=None):
+        """
+        Re-render a scan saved with SAVE_PATH_LENGTHS for new materials or energy.
         
-        print(f"Running laminography: tilt={tilt_deg}°, {len(angles_deg)} projections")
+        The projections are recomputed from the stored path lengths (see
+        pathlength.render_projection_series), without rotating or propagating
+        through the volume. Use the same volume and resolution_level as the scan.
         
-        projections = simulate_projection_series(
-            self.volume, self.lookup, self.voxel_size,
-            angles_deg, tilt_deg=tilt_deg, config=self.config
-        )
+        Args:
+            output_file: HDF5 file written by tomography_scan / laminography_scan
+            lookup: new {label (str): material} lookup in the labels of the
+                    volume file (default: the loaded lookup)
+            energy_kev: new ENERGY_KEV (default: the config's)
+            resolution_level: pyramid level the scan ran on
+        
+        Returns:
+            (n_angles, ny, nx) projections
+        """
+        with self._at_resolution(resolution_level):
+            lookup = self.lookup if lookup is None else remap_lookup(lookup, self.label_remap)
+            config = dict(self.config)
+            if energy_kev is not None:
+                config["ENERGY_KEV"] = energy_kev
+            with h5py.File(output_file, 'r') as f:
+                if "path_lengths" not in f:
+                    raise KeyError(f"{output_file} has no path lengths (run the scan with SAVE_PATH_LENGTHS)")
+                cache = PathLengthCache.open(f["path_lengths"])
+                print(f"Re-rendering {len(cache)} projections at {config['ENERGY_KEV']} keV")
+                return render_projection_series(cache, lookup, config)
+    
+    def single_projection(self, rotation_deg=0, tilt_deg=0, resolution_level=None):
+        """Single projection (optionally at pyramid level `resolution_level`)."""
+        with self._at_resolution(resolution_level):
+            projections = simulate_projection_series(
+                self.volume, self.lookup, self.voxel_size,
+                [rotation_deg], tilt_deg=tilt_deg, config=self.config
+            )
+        return projections[0]
+    
+    def calculate_dose_only(self, resolution_level=None):
+        """
+        Calculate dose distribution without projection simulation.
         
-        dose_map = None
-        dose_stats = None
-        if calculate_dose:
+        resolution_level=L estimates the dose on pyramid level L (the dose
+        map then has the shape of that level).
+        """
+        with self._at_resolution(resolution_level):
             print("Calculating dose distribution...")
             dose_map = calculate_dose_map(
                 self.volume, self.lookup,
                 self.config.get("INCIDENT_PHOTONS", 1e6),
                 self.config.get("ENERGY_KEV", 23.0),
-                self.voxel_size
+                self.voxel_size, config=self.config
             )
-            dose_stats = calculate_total_dose_statistics(dose_map, self.volume, self.lookup)
+            dose_stats = self._original_labels(calculate_total_dose_statistics(dose_map, self.volume, self.lookup))
             self._print_dose_summary(dose_stats)
         
-        self._save_results(projections, angles_deg, output_file, tilt_deg=tilt_deg, dose_map=dose_map)
-        print(f"Saved to: {output_file}")
-        return projections, dose_stats
-    
-    def single_projection(self, rotation_deg=0, tilt_deg=0):
-        """Single projection."""
-        projections = simulate_projection_series(
-            self.volume, self.lookup, self.voxel_size,
-            [rotation_deg], tilt_deg=tilt_deg, config=self.config
-        )
-        return projections[0]
-    
-    def calculate_dose_only(self):
-        """Calculate dose distribution without projection simulation."""
-        if self.volume is None:
-            raise ValueError("Load volume first")
-        
-        print("Calculating dose distribution...")
-        dose_map = calculate_dose_map(
-            self.volume, self.lookup,
-            self.config.get("INCIDENT_PHOTONS", 1e6),
-            self.config.get("ENERGY_KEV", 23.0),
-            self.voxel_size
-        )
-        dose_stats = calculate_total_dose_statistics(dose_map, self.volume, self.lookup)
-        self._print_dose_summary(dose_stats)
-        
         return dose_map, dose_stats
     
+    def _original_labels(self, dose_stats):
+        """Re-key per-label dose statistics from loaded (remapped) labels to the original ones of the metadata lookup."""
+        if not self.label_remap:
+            return dose_stats
+        original = {str(loaded): str(label) for label, loaded in self.label_remap.items()}
+        return {original.get(str(label), label): stats for label, stats in dose_stats.items()}
+    
     def _print_dose_summary(self, dose_stats):
         """Print dose statistics summary."""
         print("\nDose Summary:")
@@ -133,49 +325,65 @@ class XRayScanner:
             print(f"  Volume:    {stats['total_volume_um3']:.1f} μm³")
             total_dose += stats['mean_dose_gy'] * stats['voxel_count']
         
-        avg_dose = total_dose / np.sum(self.volume > 0) if np.sum(self.volume > 0) > 0 else 0
+        # Non-vacuum voxels, counted slab by slab for lazy volumes
+        if hasattr(self.volume, 'iter_slabs'):
+            n_labeled = sum(int(np.count_nonzero(slab)) for _, _, slab in self.volume.iter_slabs())
+        else:
+            n_labeled = int(np.count_nonzero(self.volume))
+        avg_dose = total_dose / n_labeled if n_labeled > 0 else 0
         print(f"\nAverage dose across phantom: {avg_dose:.2e} Gy")
         print("-" * 50)
     
-    def _save_results(self, projections, angles, output_file, tilt_deg=0, dose_map=None):
-        """Save projections and optional dose data to HDF5."""
-        with h5py.File(output_file, 'w') as f:
-            # Projection data
-            exchange = f.create_group("exchange")
-            exchange.create_dataset("data", data=projections.astype('float32'), compression='gzip')
-            f.create_dataset("angles", data=np.array(angles, dtype='float32'))
-            
-            # Dose data (if calculated)
-            if dose_map is not None:
-                dose_group = f.create_group("dose")
-                dose_group.create_dataset("dose_map", data=dose_map.astype('float32'), compression='gzip')
-                dose_group.attrs['units'] = 'Gray'
-                dose_group.attrs['description'] = 'Absorbed dose per voxel'
-            
-            # Metadata
-            f.attrs['tilt_angle_deg'] = tilt_deg
-            f.attrs['energy_kev'] = self.config.get("ENERGY_KEV", 23.0)
-            f.attrs['incident_photons'] = self.config.get("INCIDENT_PHOTONS", 1e6)
-            f.attrs['detector_distance_m'] = self.config.get("DETECTOR_DIST", 0.3)
-            f.attrs['voxel_size_um'] = self.voxel_size
+    def _create_output(self, f, angles, tilt_deg=0):
+        """
+        Lay out the HDF5 output and return the projection dataset.
+        
+        exchange/data is pre-allocated with one chunk per projection so frames
+        can be written (and survive a crash) one at a time.
+        """
+        _, ny, nx = self.volume.shape
+        exchange = f.create_group("exchange")
+        data = exchange.create_dataset(
+            "data", shape=(len(angles), ny, nx), dtype='float32',
+            chunks=(1, ny, nx), compression='gzip'
+        )
+        f.create_dataset("angles", data=np.array(angles, dtype='float32'))
+        
+        # Metadata
+        f.attrs['tilt_angle_deg'] = tilt_deg
+        f.attrs['energy_kev'] = self.config.get("ENERGY_KEV", 23.0)
+        f.attrs['incident_photons'] = self.config.get("INCIDENT_PHOTONS", 1e6)
+        f.attrs['detector_distance_m'] = self.config.get("DETECTOR_DIST", 0.3)
+        f.attrs['voxel_size_um'] = self.voxel_size
+        f.attrs['resolution_level'] = self.resolution_level
+        return data
+    
+    def _save_dose(self, f, dose_map):
+        """Save the dose map next to the projections."""
+        if "dose" in f:
+            del f["dose"]
+        dose_group = f.create_group("dose")
+        dose_group.create_dataset("dose_map", data=dose_map.astype('float32'), compression='gzip')
+        dose_group.attrs['units'] = 'Gray'
+        dose_group.attrs['description'] = 'Absorbed dose per voxel'
 
 # Quick functions with dose calculation
-def quick_tomography(volume_path, metadata_path, n_projections=180, output_file="tomo.h5", calculate_dose=False):
-    """Quick tomography scan with optional dose calculation."""
+def quick_tomography(volume_path, metadata_path, n_projections=180, output_file="tomo.h5", calculate_dose=False, resolution_level=0):
+    """Quick tomography scan with optional dose calculation, at pyramid level `resolution_level`."""
     scanner = XRayScanner()
-    scanner.load_volume(volume_path, metadata_path)
+    scanner.load_volume(volume_path, metadata_path, resolution_level=resolution_level)
     angles = np.linspace(0, 180, n_projections)
     return scanner.tomography_scan(angles, output_file, calculate_dose=calculate_dose)
 
-def quick_laminography(volume_path, metadata_path, tilt_deg=45, n_projections=360, output_file="lamino.h5", calculate_dose=False):
-    """Quick laminography scan with optional dose calculation."""
+def quick_laminography(volume_path, metadata_path, tilt_deg=45, n_projections=360, output_file="lamino.h5", calculate_dose=False, resolution_level=0):
+    """Quick laminography scan with optional dose calculation, at pyramid level `resolution_level`."""
     scanner = XRayScanner()
-    scanner.load_volume(volume_path, metadata_path)
+    scanner.load_volume(volume_path, metadata_path, resolution_level=resolution_level)
     angles = np.linspace(0, 360, n_projections)
     return scanner.laminography_scan(angles, tilt_deg, output_file, calculate_dose=calculate_dose)
 
-def analyze_dose_only(volume_path, metadata_path, config_file="config.json"):
-    """Calculate dose distribution without running simulation."""
+def analyze_dose_only(volume_path, metadata_path, config_file="config.json", resolution_level=0):
+    """Calculate dose distribution without running simulation (e.g. resolution_level=2 for a quick estimate)."""
     scanner = XRayScanner(config_file)
-    scanner.load_volume(volume_path, metadata_path)
+    scanner.load_volume(volume_path, metadata_path, resolution_level=resolution_level)
     return scanner.calculate_dose_only()
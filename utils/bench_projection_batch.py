@@ -0,0 +1,56 @@
+import numpy as np
+import os
+import sys
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from msim.generate_phantom import create_complex_bone_phantom
+from msim.geometry import GPUVolumeManager, projection_batch_size
+from msim.propagator import get_propagator_plan
+
+# Batched propagation benchmark: projections per second of the rotate +
+# propagate loop for several projection batch sizes.
+#
+# Usage: python bench_projection_batch.py [edge] [n_angles] [backend]
+#        (bone phantom of edge^3 voxels, default 128; 32 angles; backend "auto")
+
+edge = int(sys.argv[1]) if len(sys.argv) > 1 else 128
+n_angles = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+backend = sys.argv[3] if len(sys.argv) > 3 else "auto"
+
+config = {
+    "ENERGY_KEV": 23.0, "DETECTOR_DIST": 0.3, "DETECTOR_PIXEL_SIZE": 5e-7, "PAD": 16,
+    "ENABLE_PHASE": True, "ENABLE_ABSORPTION": True, "ENABLE_SCATTER": True,
+    "ENABLE_PHOTON_NOISE": False, "DARK_CURRENT": 0, "READOUT_NOISE": 0,
+    "BACKEND": backend,
+}
+materials = {
+    "0": {"composition": {}, "density": 0.0},
+    "1": {"composition": {"H": 10, "C": 5, "N": 1, "O": 4}, "density": 1.06},
+    "2": {"composition": {"Ca": 10, "P": 6, "O": 26, "H": 2}, "density": 1.92},
+    "3": {"composition": {"H": 11, "C": 6, "N": 0.1, "O": 1}, "density": 0.98},
+    "4": {"composition": {"Ca": 1, "C": 1, "O": 3}, "density": 2.71},
+    "5": {"composition": {"Ca": 8, "P": 5, "O": 22, "H": 2}, "density": 1.18},
+    "6": {"composition": {"Ti": 1}, "density": 4.51},
+    "7": {"composition": {"I": 1, "H": 2, "O": 1}, "density": 1.5},
+}
+voxel_size = (0.5, 0.5, 0.5)
+
+volume = create_complex_bone_phantom((edge, edge, edge))
+angles = np.linspace(0, 180, n_angles, endpoint=False)
+pad = config["PAD"]
+plan = get_propagator_plan((edge + 2*pad, edge + 2*pad), voxel_size, config)
+auto = projection_batch_size(volume.shape, volume.dtype.itemsize, dict(config, PROJECTION_BATCH="auto"))
+
+print(f"Shape {volume.shape}, {n_angles} angles, backend {plan.backend.name}, auto batch {auto}\n")
+print(f"{'batch':>6}{'time (s)':>10}{'proj/s':>10}")
+
+for batch in sorted({1, 2, 4, 8, auto}):
+    manager = GPUVolumeManager(volume, materials, voxel_size, config, plan=plan)
+    manager.rotate_and_project_batch(angles[:batch])  # warm-up: buffers, FFT plans
+    t0 = time.perf_counter()
+    for start in range(0, n_angles, batch):
+        manager.rotate_and_project_batch(angles[start:start + batch])
+    elapsed = time.perf_counter() - t0
+    print(f"{batch:>6}{elapsed:>10.2f}{n_angles / elapsed:>10.2f}")
+    manager.cleanup()
@@ -0,0 +1,73 @@
+import numpy as np
+import os
+import sys
+import time
+import shutil
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from msim.io import save_multiscale_zarr, DEFAULT_COMPRESSION
+from msim.generate_phantom import (
+    create_sphere_phantom, create_cylinder_phantom, create_complex_bone_phantom,
+    create_microstructure_phantom, create_dose_test_phantom
+)
+
+# Multiscale Zarr write benchmark: throughput (MB/s of uncompressed labels,
+# all pyramid levels) and on-disk size ratio for the bundled phantoms.
+#
+# Usage: python bench_zarr_write.py [edge]   (phantoms of edge^3 voxels, default 256)
+
+edge = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+shape = (edge, edge, edge)
+n_scales = 3
+n_threads = os.cpu_count() or 1
+
+phantoms = [
+    ("sphere",         create_sphere_phantom),
+    ("cylinder",       create_cylinder_phantom),
+    ("bone",           create_complex_bone_phantom),
+    ("microstructure", create_microstructure_phantom),
+    ("dose_test",      create_dose_test_phantom),
+]
+
+settings = [
+    ("raw, 1 thread",             {"compression": "raw"}, 1),
+    ("blosc-zstd, 1 thread",      DEFAULT_COMPRESSION,    1),
+    (f"blosc-zstd, {n_threads} threads", DEFAULT_COMPRESSION, n_threads),
+]
+
+def disk_usage(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+def pyramid_bytes(volume, n_scales):
+    """Uncompressed size of all levels (level shapes are ceil(n / 2) per level)."""
+    total, level_shape = 0, volume.shape
+    for _ in range(n_scales):
+        total += int(np.prod(level_shape)) * volume.dtype.itemsize
+        level_shape = tuple((n + 1) // 2 for n in level_shape)
+    return total
+
+workdir = tempfile.mkdtemp(prefix="msim_bench_")
+print(f"Shape {shape}, {n_scales} levels, output in {workdir}\n")
+print(f"{'phantom':<16}{'setting':<28}{'time (s)':>10}{'MB/s':>10}{'ratio':>8}")
+
+try:
+    for name, create in phantoms:
+        volume = create(shape)
+        codes = {f"label_{v}": int(v) for v in np.unique(volume)}
+        size = pyramid_bytes(volume, n_scales)
+
+        for label, compression, threads in settings:
+            out_dir = os.path.join(workdir, f"{name}.zarr")
+            t0 = time.perf_counter()
+            save_multiscale_zarr(volume, codes, out_dir, n_scales=n_scales,
+                                 compression=compression, n_threads=threads)
+            elapsed = time.perf_counter() - t0
+            on_disk = disk_usage(out_dir)
+            print(f"{name:<16}{label:<28}{elapsed:>10.2f}{size / 1e6 / elapsed:>10.1f}{size / on_disk:>8.1f}")
+            shutil.rmtree(out_dir)
+finally:
+    shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,38 @@
+import numpy as np
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from msim.physics import projection
+
+try:
+    import cupy
+except ImportError:
+    print("\n[SKIP] CuPy not available: the default backend is NumPy")
+    sys.exit(0)
+
+
+# ------------------------------------------------------------------
+# NumPy backend vs the default (CuPy) backend, without detector noise
+# ------------------------------------------------------------------
+lookup = {
+    "0": {"composition": {}, "density": 0.0},
+    "1": {"composition": {"H": 2, "O": 1}, "density": 1.0},
+    "2": {"composition": {"Ca": 10, "P": 6, "O": 26, "H": 2}, "density": 1.92},
+}
+labels = np.zeros((48, 64, 64), dtype=np.uint8)
+labels[8:40, 12:52, 12:52] = 1
+labels[16:32, 20:44, 24:40] = 2
+voxel_size = (0.5, 0.5, 0.5)
+
+config = {"MATERIAL_CACHE": "", "ENERGY_KEV": 23.0, "DETECTOR_DIST": 0.05, "PAD": 16,
+          "ENABLE_PHASE": True, "ENABLE_ABSORPTION": True, "ENABLE_SCATTER": True,
+          "ENABLE_PHOTON_NOISE": False, "DARK_CURRENT": 0, "READOUT_NOISE": 0}
+
+for propagation in ("multislice", "projection"):
+    run = dict(config, PROPAGATION=propagation)
+    ref = projection(labels, lookup, voxel_size, dict(run, BACKEND="numpy"))
+    sim = projection(labels, lookup, voxel_size, run)
+    rel = float(np.abs(sim - ref).max() / np.abs(ref).max())
+    print(f"\n[TEST] {propagation}: default backend vs numpy, max relative difference {rel:.2e}")
+    assert rel < 1e-4
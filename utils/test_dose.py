@@ -0,0 +1,95 @@
+import numpy as np
+import sys
+import os
+import xraylib
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from msim.physics import calculate_dose_map_accurate
+from msim.geometry import DoseAccumulator, rotate_labels
+
+
+# ------------------------------------------------------------------
+# Vectorized dose map vs the per-label, per-ray loop it replaced
+# ------------------------------------------------------------------
+def reference_dose_map(volume_labels, lookup, incident_photons, energy_kev, voxel_size):
+    """Per-label masks and a per-ray python loop over z (the original implementation)."""
+    xraylib.XRayInit()
+    nz, ny, nx = volume_labels.shape
+    dose_map = np.zeros((nz, ny, nx), dtype='float32')
+
+    photon_energy_J = energy_kev * 1e3 * 1.602176634e-19
+    voxel_thickness_cm = voxel_size[0] * 1e-4
+    voxel_volume_cm3 = np.prod(voxel_size) * 1e-12
+
+    mu_total_map = np.zeros((nz, ny, nx), dtype='float32')
+    mu_en_map = np.zeros((nz, ny, nx), dtype='float32')
+    density_map = np.zeros((nz, ny, nx), dtype='float32')
+    for label_id, props in lookup.items():
+        mask = (volume_labels == int(label_id))
+        composition = props.get('composition', {})
+        density = props.get('density', 0.0)
+        if not np.any(mask) or not composition or density == 0.0:
+            continue
+        formula = ''.join(f"{el}{amt}" for el, amt in composition.items())
+        mu_total_map[mask] = xraylib.CS_Total_CP(formula, energy_kev) * density
+        mu_en_map[mask] = xraylib.CS_Energy_CP(formula, energy_kev) * density
+        density_map[mask] = density
+
+    for y in range(ny):
+        for x in range(nx):
+            beam_intensity = incident_photons * photon_energy_J
+            for z in range(nz):
+                if mu_total_map[z, y, x] > 0:
+                    mass_per_voxel = density_map[z, y, x] * voxel_volume_cm3
+                    if mass_per_voxel > 0:
+                        energy_absorbed = beam_intensity * mu_en_map[z, y, x] * voxel_thickness_cm
+                        dose_map[z, y, x] = energy_absorbed / (mass_per_voxel * 1e-3)
+                    beam_intensity *= np.exp(-mu_total_map[z, y, x] * voxel_thickness_cm)
+    return dose_map
+
+# Label 0 is vacuum, label 4 is in the volume but missing from the lookup
+lookup = {
+    "0": {"composition": {}, "density": 0.0},
+    "1": {"composition": {"H": 2, "O": 1}, "density": 1.0},
+    "2": {"composition": {"Ca": 10, "P": 6, "O": 26, "H": 2}, "density": 1.92},
+    "3": {"composition": {"Ti": 1}, "density": 4.51},
+}
+config = {"MATERIAL_CACHE": ""}  # in-memory constants only
+
+rng = np.random.default_rng(0)
+for shape, voxel_size, slab_size in [((12, 9, 7), (0.5, 0.5, 0.5), 32),
+                                     ((40, 6, 5), (2.0, 1.0, 1.0), 16),
+                                     ((33, 8, 8), (10.0, 10.0, 10.0), 8)]:
+    labels = rng.integers(0, 5, size=shape).astype(np.uint8)
+    ref = reference_dose_map(labels, lookup, 1e6, 23.0, voxel_size)
+    dose = calculate_dose_map_accurate(labels, lookup, 1e6, 23.0, voxel_size, slab_size=slab_size, config=config)
+
+    rel = float(np.abs(dose - ref).max() / ref.max())
+    print(f"\n[TEST] shape={shape} voxel={voxel_size} slab={slab_size}: max relative difference {rel:.2e}")
+    assert rel < 1e-5
+    assert np.array_equal(dose > 0, ref > 0)
+    assert not dose[(labels == 0) | (labels == 4)].any()
+
+
+# ------------------------------------------------------------------
+# Series dose: material voxels get dose at every angle, vacuum none
+# ------------------------------------------------------------------
+labels = np.zeros((20, 40, 40), dtype=np.uint8)
+labels[4:16, 10:30, 10:30] = 1
+labels[6:14, 15:25, 15:25] = 3
+config = {"MATERIAL_CACHE": "", "INCIDENT_PHOTONS": 1e6, "ENERGY_KEV": 23.0}
+voxel_size = (0.5, 0.5, 0.5)
+
+for angle, tilt in [(0, 0), (30, 0), (45, 20), (90, 0)]:
+    acc = DoseAccumulator(labels, lookup, voxel_size, config)
+    rotated, quat = rotate_labels(labels, angle, tilt, config)
+    acc.add(rotated, quat)
+    dose = acc.dose_map(1)
+    n_holes = int((dose[labels > 0] == 0).sum())
+    n_leaks = int((dose[labels == 0] != 0).sum())
+    print(f"\n[TEST] DoseAccumulator angle={angle} tilt={tilt}: {n_holes} material voxels without dose, "
+          f"{n_leaks} vacuum voxels with dose")
+    assert n_holes == 0 and n_leaks == 0
+    if angle == 0 and tilt == 0:
+        ref = calculate_dose_map_accurate(labels, lookup, 1e6, 23.0, voxel_size, config=config)
+        assert np.allclose(dose, ref, rtol=1e-5, atol=0)
@@ -0,0 +1,36 @@
+import numpy as np
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from msim.labels import compact_labels, compact_label_plan, label_ids
+
+
+# ------------------------------------------------------------------
+# Sparse labels without 0: no material may be remapped onto 0 (background)
+# ------------------------------------------------------------------
+rng = np.random.default_rng(0)
+ids = np.array([1000, 2500, 70000])
+volume = rng.choice(ids, size=(8, 16, 16)).astype(np.int32)
+lookup = {str(i): {"composition": {"H": 2, "O": 1}, "density": float(n + 1)} for n, i in enumerate(ids)}
+
+labels, compact_lookup, remap = compact_labels(volume, lookup)
+print(f"\n[TEST] no label 0: dtype {labels.dtype}, remap {remap}")
+assert labels.dtype == np.uint8
+assert remap[0] == 0
+assert 0 not in [remap[int(i)] for i in ids]
+assert not (labels == 0).any()
+assert "0" not in compact_lookup
+for i in ids:
+    assert np.array_equal(labels == remap[int(i)], volume == i)
+    assert compact_lookup[str(remap[int(i)])] == lookup[str(i)]
+
+# Same set passed as ids (the plan used by the simulator and the writers)
+dtype, plan = compact_label_plan(label_ids(volume), lookup)
+assert dtype == np.uint8 and plan.as_dict() == remap
+
+# Dense labels without 0 are only cast, and keep their values
+volume = rng.integers(1, 200, size=(4, 8, 8)).astype(np.int64)
+labels, _, remap = compact_labels(volume)
+print(f"\n[TEST] dense labels without 0: dtype {labels.dtype}, remap {remap}")
+assert remap is None and labels.dtype == np.uint8 and np.array_equal(labels, volume)
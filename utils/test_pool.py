@@ -0,0 +1,49 @@
+import numpy as np
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from msim.geometry import simulate_projection_series
+
+
+# ------------------------------------------------------------------
+# Seeded series: serial (few-angle and batched) vs the process pool
+# ------------------------------------------------------------------
+if __name__ == "__main__":  # the pool spawns workers that import this script
+    try:
+        import cupy
+        backend = "cupy"
+    except ImportError:
+        backend = "numpy"
+
+    lookup = {
+        "0": {"composition": {}, "density": 0.0},
+        "1": {"composition": {"H": 2, "O": 1}, "density": 1.0},
+        "2": {"composition": {"Ti": 1}, "density": 4.51},
+    }
+    labels = np.zeros((24, 32, 32), dtype=np.uint8)
+    labels[4:20, 8:24, 8:24] = 1
+    labels[8:16, 12:20, 10:18] = 2
+    voxel_size = (0.5, 0.5, 0.5)
+    config = {"MATERIAL_CACHE": "", "BACKEND": backend, "ENERGY_KEV": 23.0, "DETECTOR_DIST": 0.05, "PAD": 8,
+              "ENABLE_PHASE": True, "ENABLE_ABSORPTION": True, "ENABLE_SCATTER": True,
+              "ADD_RANDOM_PHASE": True, "RANDOM_SEED": 1234}
+
+    for n_angles in (3, 8):  # few-angle path and batched path
+        angles = np.linspace(0, 180, n_angles, endpoint=False)
+        serial = simulate_projection_series(labels, lookup, voxel_size, angles, 0, dict(config, N_WORKERS=1))
+        pool = simulate_projection_series(labels, lookup, voxel_size, angles, 0, dict(config, N_WORKERS=2))
+        diff = float(np.abs(serial - pool).max())
+        print(f"\n[TEST] BACKEND={backend}, {n_angles} angles: serial vs pool max difference {diff:.3g} counts")
+        if backend == "numpy":
+            assert np.array_equal(serial, pool)
+        else:
+            # pool workers run on NumPy: same noise stream, FFT rounding differs from the GPU
+            assert diff <= 1e-4 * float(np.abs(serial).max())
+
+        # BACKEND is left out of the checkpoint fingerprint: a series resumed
+        # on another backend must draw the same noise
+        host = simulate_projection_series(labels, lookup, voxel_size, angles, 0, dict(config, BACKEND="numpy"))
+        diff = float(np.abs(serial - host).max())
+        print(f"\n[TEST] {n_angles} angles: BACKEND={backend} vs numpy max difference {diff:.3g} counts")
+        assert diff <= 1e-4 * float(np.abs(serial).max())
@@ -3,7 +3,7 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../msim")))
 
-from LSim_wrap import rotate_volume, build_quaternion
+from LSim_wrap import rotate_volume, rotate_volume_cpu, build_quaternion, ROTATION_BACKEND
 
 
 # Define the test parameters
@@ -11,6 +11,8 @@ nz, ny, nx = 100, 100, 100
 theta = np.deg2rad(45)
 q = build_quaternion(np.deg2rad(20), theta)  # tilt axis (alpha=20°), rotate 45°
 
+print(f"Rotation backend: {ROTATION_BACKEND}")
+
 # Supported dtypes with label and dtype object
 test_dtypes = [
     ("uint8",   np.uint8),
@@ -34,3 +36,51 @@ for label, dtype in test_dtypes:
     rotate_volume(vol, out, q)
 
     print(f"[OK] Max value in rotated volume: {out.max()} (dtype={out.dtype})")
+
+
+# ------------------------------------------------------------------
+# CPU rotation vs CUDA kernel semantics
+# ------------------------------------------------------------------
+def reference_rotate(vol, quaternion):
+    """Per-voxel transcription of rotate_volume_kernel (lkernel.cu)."""
+    w, x, y, z = quaternion
+    n = np.sqrt(w*w + x*x + y*y + z*z)
+    w, x, y, z = w/n, x/n, y/n, z/n
+    R = [1 - 2*(y*y + z*z), 2*(x*y - z*w), 2*(x*z + y*w),
+         2*(x*y + z*w), 1 - 2*(x*x + z*z), 2*(y*z - x*w),
+         2*(x*z - y*w), 2*(y*z + x*w), 1 - 2*(x*x + y*y)]
+    c_round = lambda a: int(np.floor(a + 0.5)) if a >= 0 else int(np.ceil(a - 0.5))
+
+    nz, ny, nx = vol.shape
+    cx, cy, cz = 0.5 * (nx - 1), 0.5 * (ny - 1), 0.5 * (nz - 1)
+    out = np.zeros_like(vol)
+    for iz in range(nz):
+        for iy in range(ny):
+            for ix in range(nx):
+                x, y, z = ix - cx, iy - cy, iz - cz
+                rx = c_round(R[0]*x + R[3]*y + R[6]*z + cx)
+                ry = c_round(R[1]*x + R[4]*y + R[7]*z + cy)
+                rz = c_round(R[2]*x + R[5]*y + R[8]*z + cz)
+                if 0 <= rx < nx and 0 <= ry < ny and 0 <= rz < nz:
+                    out[iz, iy, ix] = vol[rz, ry, rx]
+    return out
+
+rng = np.random.default_rng(0)
+labels = rng.integers(0, 8, size=(16, 21, 24)).astype(np.uint16)
+
+for alpha_deg, theta_deg in [(0, 0), (0, 45), (20, 45), (0, 90), (30, 180)]:
+    qa = build_quaternion(np.deg2rad(alpha_deg), np.deg2rad(theta_deg))
+    ref = reference_rotate(labels, qa)
+
+    cpu = np.zeros_like(labels)
+    rotate_volume_cpu(labels, cpu, qa)
+    n_diff = int((cpu != ref).sum())
+    print(f"\n[TEST] CPU alpha={alpha_deg} theta={theta_deg}: {n_diff} voxels differ from kernel reference")
+    assert n_diff == 0
+
+    if ROTATION_BACKEND == "cuda":
+        gpu = np.zeros_like(labels)
+        rotate_volume(labels, gpu, qa)
+        n_diff = int((gpu != cpu).sum())
+        print(f"[TEST] CUDA vs CPU: {n_diff} voxels differ")
+        assert n_diff == 0